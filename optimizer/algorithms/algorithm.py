@@ -1,6 +1,20 @@
+import os
+import pickle
+import random
+
+import numpy as np
+
+from optimizer.migration import Island
+from optimizer.solution import Solution
+from optimizer.timing import timers
+from optimizer.surrogate import SurrogateModel
+
 class Algorithm:
+    shares_evaluations = False  # the ranks use each other's costs, which must then all be computed alike
+
     def __init__(self, hparams, problem_size, comm, logger, optimize_problem_size) -> None:
         self.default_hparams = { }
+        self.hparam_switches = { } # hyperparameter: the one enabling it (it has no effect when that one is 0)
         self.hparams = { } # this will remain empty untill parse_hyperparameters
         self.raw_hparams = hparams
         self.problem_size = problem_size
@@ -8,14 +22,21 @@ class Algorithm:
         self.comm = comm
         self.logger = logger
         self.optimize_problem_size = optimize_problem_size
+        self.surrogate = None
+        self.island = None
+        self.checkpoint_path = None
+        self.checkpoint_interval = 1
+        self.resume = False
 
     def run(self, num_steps, evaluator) -> None:
         raise NotImplementedError
     
-    def register_hyperparameter(self, key, default_value):
+    def register_hyperparameter(self, key, default_value, enabled_by=None):
         if self.hyperparameters_parsed:
             raise Exception('Hyperparameters already parsed')
         self.default_hparams[key] = default_value
+        if enabled_by is not None:
+            self.hparam_switches[key] = enabled_by
 
     def parse_hyperparameters(self):
         parsed_hparams = self.default_hparams.copy()
@@ -25,4 +46,142 @@ class Algorithm:
             parsed_hparams[k] = v
         self.hparams = parsed_hparams
         self.hyperparameters_parsed = True
-            
+
+    def register_surrogate_hyperparameters(self):
+        self.register_hyperparameter('surrogate_keep', 0)  # neighbors kept after screening, 0 disables it
+        # measurements before the model is used
+        self.register_hyperparameter('surrogate_min_samples', 10, enabled_by='surrogate_keep')
+
+    def init_surrogate(self):
+        if self.hparams['surrogate_keep'] > 0:
+            self.surrogate = SurrogateModel(min_samples=self.hparams['surrogate_min_samples'])
+
+    def screen_neighbors(self, neighbors):
+        """Keeps only the most promising neighbors according to the surrogate model (when enabled and trained)"""
+        if self.surrogate is None or not self.surrogate.is_ready():
+            return neighbors
+        return self.surrogate.screen(neighbors, self.hparams['surrogate_keep'])
+
+    def observe(self, solution, cost):
+        """Feeds a measurement to the surrogate model and logs how far off its prediction was"""
+        if self.surrogate is None:
+            return
+        predicted = self.surrogate.observe(solution, cost)
+        if predicted is not None:
+            self.logger.write_info(f'Surrogate predicted {predicted:.2f}, measured {cost}')
+
+    def report_surrogate(self):
+        if self.surrogate is None:
+            return
+        report = self.surrogate.report()
+        self.logger.write_info(
+            f"Surrogate accuracy over {report['samples']} screened solutions: "
+            f"MAE={report['mae']} correlation={report['correlation']}"
+        )
+
+    def register_migration_hyperparameters(self):
+        self.register_hyperparameter('migration_interval', 0)  # steps between migrations, 0 disables them
+        # ring, bidirectional, all or random; migrants replace the current solution if better or always
+        self.register_hyperparameter('migration_topology', 'ring', enabled_by='migration_interval')
+        self.register_hyperparameter('migration_policy', 'better', enabled_by='migration_interval')
+
+    def uses_shared_evaluations(self):
+        return self.shares_evaluations or self.hparams.get('migration_interval', 0) > 0
+
+    def init_migration(self):
+        if self.hparams['migration_interval'] > 0 and self.comm.Get_size() > 1:
+            self.island = Island(self.comm, self.hparams['migration_interval'], self.hparams['migration_topology'],
+                                 self.hparams['migration_policy'])
+
+    def migrate(self, k, solution, cost, evaluator):
+        """
+        Sends this rank's solution to its neighbours at migration steps and returns the (solution, cost) arrived
+        from them that the search should continue from, or None. Migrants keep the cost measured by their rank.
+        """
+        if self.island is None:
+            return None
+        arrival = self.island.exchange(k, solution, cost)
+        if arrival is None:
+            return None
+        rank, solution, cost = arrival
+        evaluator.set_cost(solution, cost)
+        self.observe(solution, cost)
+        self.logger.write_msg(
+            k, evaluator.get_counter(), cost, solution, flair=f'Migrant from rank {rank}'
+        )
+        return solution, cost
+
+    def finish_migration(self):
+        """Must be called by every rank once its search is over (when migration is enabled)"""
+        if self.island is None:
+            return
+        self.island.finish()
+        self.logger.write_info(f'Migration: {self.island.sent} solutions sent, {self.island.received} received')
+
+    def configure_checkpoint(self, path, interval=1, resume=False):
+        """Saves the search state to {path}.rank{rank}.pkl every `interval` steps (0 disables it)"""
+        self.checkpoint_path = path
+        self.checkpoint_interval = interval
+        self.resume = resume
+
+    def checkpoint_file(self):
+        return f'{self.checkpoint_path}.rank{self.comm.Get_rank()}.pkl'
+
+    def save_state(self, k, state, evaluator):
+        """
+        Saves the state of the search loop (any picklable object) together with everything else needed
+        to continue exactly from this point: random generators, evaluator counters, known costs and surrogate.
+        """
+        if self.checkpoint_path is None or self.checkpoint_interval <= 0 or k % self.checkpoint_interval != 0:
+            return
+        checkpoint = {
+            'algorithm': type(self).__name__,
+            'state': state,
+            'random': random.getstate(),
+            'np_random': np.random.get_state(),
+            'run_counter': evaluator.evaluation_session.run_counter,
+            'known_costs': Solution.get_known_costs(),
+            'objectives': evaluator.objectives,
+            'surrogate': self.surrogate,
+        }
+        file_name = self.checkpoint_file()
+        with open(file_name + '.tmp', 'wb') as f:
+            pickle.dump(checkpoint, f)
+        os.replace(file_name + '.tmp', file_name)
+
+    def load_state(self, evaluator):
+        """Returns the state saved by this rank in a previous run, or None when not resuming"""
+        if not self.resume or self.checkpoint_path is None:
+            return None
+        file_name = self.checkpoint_file()
+        if not os.path.exists(file_name):
+            # e.g. resuming with more ranks than before: this rank starts from scratch
+            self.logger.write_info(f'No checkpoint {file_name}, starting from scratch')
+            return None
+        with open(file_name, 'rb') as f:
+            checkpoint = pickle.load(f)
+        if checkpoint['algorithm'] != type(self).__name__:
+            raise Exception(f"Checkpoint {file_name} was saved by {checkpoint['algorithm']}")
+        random.setstate(checkpoint['random'])
+        np.random.set_state(checkpoint['np_random'])
+        evaluator.evaluation_session.run_counter = checkpoint['run_counter']
+        Solution.set_known_costs(checkpoint['known_costs'])
+        for solution, objectives in checkpoint['objectives'].items():
+            evaluator.add_objectives(solution, objectives)
+        self.surrogate = checkpoint['surrogate']
+        self.logger.write_info(f'Resuming from {file_name}')
+        return checkpoint['state']
+
+    def save_shared_state(self, k, state, evaluator):
+        """save_state for searches run in lockstep by all ranks: only the root saves"""
+        if self.comm.Get_rank() == 0:
+            self.save_state(k, state, evaluator)
+
+    def load_shared_state(self, evaluator):
+        """
+        Collective load_state for searches run in lockstep by all ranks: the state saved by the root, on every rank,
+        so that they all resume from the same point whatever the number of ranks.
+        """
+        state = self.load_state(evaluator) if self.comm.Get_rank() == 0 else None
+        with timers.phase('mpi_wait'):
+            return self.comm.bcast(state)
@@ -1,16 +1,22 @@
 from optimizer.algorithms.hill_climbing import HillClimbing
-from optimizer.algorithms.greedy import Greedy, TabuGreedy
+from optimizer.algorithms.greedy import Greedy, TabuGreedy, ParallelGreedy
 from optimizer.algorithms.local_conditionnal_acceptance import LocalConditionnalAcceptance
-from optimizer.algorithms.curious_simulated_annealing import CuriousSimulatedAnnealing
+from optimizer.algorithms.curious_simulated_annealing import CuriousSimulatedAnnealing, AsyncCuriousSimulatedAnnealing
 from optimizer.algorithms.cmaes import CMAESAlgorithm
+from optimizer.algorithms.sweep import Sweep
+from optimizer.algorithms.successive_halving import SuccessiveHalving
 
 ALGORITHMS = {
     'hill_climbing': HillClimbing,
     'greedy': Greedy,
     'tabu_greedy': TabuGreedy,
+    'parallel_greedy': ParallelGreedy,
     'simulated_annealing': LocalConditionnalAcceptance,
     'csa': CuriousSimulatedAnnealing,
-    'cmaes': CMAESAlgorithm #TODO: Fix cma
+    'async_csa': AsyncCuriousSimulatedAnnealing,
+    'cmaes': CMAESAlgorithm, #TODO: Fix cma
+    'sweep': Sweep,
+    'successive_halving': SuccessiveHalving,
 }
 
 def get_algorithm(algorithm_name):
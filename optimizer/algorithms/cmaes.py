@@ -6,44 +6,60 @@ from optimizer.evaluators import Simulator
 from optimizer.random_solution import get_random_solution
 from optimizer.solution_space import SolutionSpace
 from optimizer.algorithms import Algorithm
-from optimizer.algorithms.curious_simulated_annealing import group_particles, ungroup_particles
+from optimizer.executors import MPIExecutor
+from optimizer.pareto import dominance_fitness
 
 
 class CMAESAlgorithm(Algorithm):
+    shares_evaluations = True  # MPI workers evaluate for the driver
+
     def __init__(self, hparams, problem_size, comm, logger, optimize_problem_size) -> None:
         if optimize_problem_size:
             raise Exception('CMAES not compatible with optimize problem size')
         super().__init__(hparams, problem_size, comm, logger, optimize_problem_size)
+        # 'cost' ranks the population by cost, 'dominance' by Pareto front of (throughput, energy)
+        self.register_hyperparameter('ranking', 'cost')
+        self.parse_hyperparameters()
         self.problem_size_product = problem_size[0] * problem_size[1] * problem_size[2]
         self.iteration = 0
 
     def run(self, kmax, evaluator):
+        if self.hparams['ranking'] == 'dominance' and evaluator.pareto is None:
+            raise Exception('Dominance ranking needs several objectives (--use_energy)')
         self.evaluator = evaluator
+        # with several processes the population is spread over all ranks
+        self.executor = MPIExecutor(self.comm) if self.comm.Get_size() > 1 else None
         # slaves: go straight to slave execution, the only thing they will
-        # do is wait for the scatter, then 
+        # do is evaluate the solutions sent by the root until it stops them
         if self.comm.Get_rank() != 0:
-            self.execute_slave()
+            self.executor.serve(evaluator.evaluate)
             return None, None, None
 
-        initial_solution = get_random_solution(self.problem_size)
-        x0 = self.solution_to_x(initial_solution)
-        sigma0 = 1  # initial standard deviation to sample new solutions
-        num_optimizing_variables = 6 if self.optimize_problem_size else 4
-        options = {
-            'bounds': self.get_bounds(),
-            'integer_variables': list(range(num_optimizing_variables)),
-            'maxfevals': kmax,
-            'verbose': -9,
-        }
-        x, es = cma.fmin2(
-            None,  # lambda x : self.cost_function(x),
-            x0,
-            sigma0,
-            options,
-            parallel_objective=lambda xs: self.parallel_cost_function(xs),
-        )
-        self.comm.Barrier()  # alert all process to continue
-        self.comm.scatter([None] * self.comm.Get_size(), root=0)  # signal to finish
+        state = self.load_state(evaluator)
+        if state is not None:
+            es, self.iteration = state
+            es.opts['maxfevals'] = kmax  # the budget of the new run
+        else:
+            initial_solution = get_random_solution(self.problem_size)
+            x0 = self.solution_to_x(initial_solution)
+            sigma0 = 1  # initial standard deviation to sample new solutions
+            num_optimizing_variables = 6 if self.optimize_problem_size else 4
+            options = {
+                'bounds': self.get_bounds(),
+                'integer_variables': list(range(num_optimizing_variables)),
+                'maxfevals': kmax,
+                'verbose': -9,
+                'seed': np.random.randint(1, 2**31),  # follows --seed instead of the clock
+            }
+            es = cma.CMAEvolutionStrategy(x0, sigma0, options)
+        # ask/tell loop (instead of cma.fmin2) so that the strategy can be checkpointed after every generation
+        while not es.stop():
+            xs = es.ask()
+            es.tell(xs, self.parallel_cost_function(xs))
+            self.save_state(self.iteration, (es, self.iteration), evaluator)
+        x = es.result.xbest
+        if self.executor is not None:
+            self.executor.stop()  # signal to finish
         print('Returned: ', x)
         Sbest = self.x_to_solution(x)
         Sbest.display()
@@ -59,47 +75,28 @@ class CMAESAlgorithm(Algorithm):
         print('Cost: ', cost)
         return -cost
 
-    def execute_slave(self):
-        while True:
-            self.comm.Barrier()
-            # receive solutions to evaluate
-            solutions = self.comm.scatter(None, root=0)
-            if solutions is None:  # signal to stop
-                return
-            costs = self.list_costs(solutions)
-            # send costs back
-            self.comm.gather(costs, root=0)
-            self.iteration = self.iteration + 1
-
     def list_costs(self, data):
-        costs = []
-        for x in data:
-            solution = self.x_to_solution(x)
-            cost = self.evaluator.cost(solution)
+        solutions = [self.x_to_solution(x) for x in data]
+        costs = self.evaluator.cost_many(solutions, executor=self.executor)
+        for solution, cost in zip(solutions, costs):
             self.logger.write_msg(
-                self.iteration + 1, self.evaluator.get_counter(), cost, solution.get_compilation_flags(),
+                self.iteration + 1, self.evaluator.get_counter(), cost, solution,
                 flair=None,
             )
-
-            costs.append(-cost)
-        return costs
+        if self.hparams['ranking'] == 'dominance':
+            objectives = [self.evaluator.objectives[solution] for solution in solutions]
+            return list(dominance_fitness([(throughput, -energy) for throughput, energy in objectives]))
+        return [-cost for cost in costs]
 
     def parallel_cost_function(self, x):
-        # make list of N_process lists of arrays
-        grouped_x = group_particles(x, self.comm.Get_size())
-        # alert all process to continue
-        self.comm.Barrier()
-        # send data to each process
-        data = self.comm.scatter(grouped_x, root=0)
-        # calculate own costs
-        costs = self.list_costs(data)
-        # aggregate costs from all processes
-        costs = self.comm.gather(costs, root=0)
+        costs = self.list_costs(x)
         self.iteration = self.iteration + 1
-        return ungroup_particles(costs)
+        return costs
 
     def x_to_solution(self, x):
-        x_parsed = [int(np.floor(xi)) for xi in x]
+        # cma rounds integer variables after repairing the bounds, so they can land on the upper bound itself
+        upper_bounds = self.get_bounds()[1]
+        x_parsed = [int(np.clip(np.floor(xi), 0, np.floor(ub))) for xi, ub in zip(x, upper_bounds)]
         problem_size_x, problem_size_y, problem_size_z = self.problem_size
         if self.optimize_problem_size:
             problem_size_x = SolutionSpace.problem_size[x_parsed[4]]
@@ -1,30 +1,18 @@
 import random
+from collections import deque
+
 import numpy as np
 from optimizer.solution import Solution
 from optimizer.random_solution import get_random_solution
 from optimizer.algorithms import Algorithm
+from optimizer.executors import MPIExecutor
 
 def acceptance_func(energy_diff, temp):
     return 1 / (1 - energy_diff / temp) # cost is good, so we need to invert the sign
 
-def group_particles(particles, n_groups):
-    new_particles = [[] for _ in range(n_groups)]
-    for i, particle in enumerate(particles):
-        new_particles[i%n_groups].append(particle)
-    return new_particles
-
-def ungroup_particles(particles):
-    list_pointer = 0
-    new_particles = []
-    list_indexes = [0] * len(particles)
-    while list_indexes[list_pointer] != len(particles[list_pointer]):
-        index_in_list = list_indexes[list_pointer]
-        new_particles.append(particles[list_pointer][index_in_list])
-        list_indexes[list_pointer] += 1
-        list_pointer = (list_pointer+1) % len(particles)
-    return new_particles
-
 class CuriousSimulatedAnnealing(Algorithm): #(n_iter, init_state=None, n_particles=6, temperature_schedule=None)
+    shares_evaluations = True  # MPI workers evaluate for the driver
+
     def __init__(self, hparams, problem_size, comm, logger, optimize_problem_size) -> None:
         super().__init__(hparams, problem_size, comm, logger, optimize_problem_size)
         self.register_hyperparameter('t0', 1000)
@@ -38,15 +26,20 @@ class CuriousSimulatedAnnealing(Algorithm): #(n_iter, init_state=None, n_particl
         self.f = lambda x: self.hparams['lambda'] * x
 
     def run(self, num_steps, evaluator) -> None:
-        # Initialize communication
-        world_size = self.comm.Get_size()
+        # Initialize communication: the root drives the search and the population is evaluated on all ranks
         my_rank = self.comm.Get_rank()
+        executor = MPIExecutor(self.comm) if self.comm.Get_size() > 1 else None
+        if my_rank != 0:
+            executor.serve(evaluator.evaluate)
+            return None, None, None
 
-        # Initialize the particles
         n_particles = self.popsize
-        temp = self.T0
-
-        if my_rank == 0:
+        state = self.load_state(evaluator)
+        if state is not None:
+            particles, particle_weights, current_state, current_energy, path, temp, k = state
+        else:
+            # Initialize the particles
+            temp = self.T0
 
             init_state = get_random_solution(self.problem_size)
             particles = [init_state for _ in range(n_particles)]
@@ -58,61 +51,139 @@ class CuriousSimulatedAnnealing(Algorithm): #(n_iter, init_state=None, n_particl
             current_energy = evaluator.cost(init_state)
 
             self.logger.write_msg(
-                0, evaluator.get_counter(), current_energy, current_state.get_compilation_flags(), flair='Initial'
+                0, evaluator.get_counter(), current_energy, current_state, flair='Initial'
             )
+            k = 0
 
         # Iterate over the temperature schedule
-        k = 0
         while k < num_steps/n_particles:
-            if my_rank == 0:
-                # Resample the particles based on the current weights
-                indices = np.random.choice(np.arange(n_particles), size=n_particles, p=particle_weights)
-                particles = [particles[i] for i in indices]
-                particle_weights = np.ones(n_particles) / n_particles
-                particles = group_particles(particles, self.comm.Get_size())
-            else:
-                particles = None
+            # Resample the particles based on the current weights
+            indices = np.random.choice(np.arange(n_particles), size=n_particles, p=particle_weights)
+            particles = [particles[i] for i in indices]
+            particle_weights = np.ones(n_particles) / n_particles
 
-            # Update each particle
-            particles = self.comm.scatter(particles,root=0)
-            for i in range(len(particles)):
-                # Perturb the particle
-                perturbed_particle = particles[i].get_random_neighbor(self.optimize_problem_size)
+            # Perturb every particle and evaluate them as a single batch
+            perturbed_particles = [p.get_random_neighbor(self.optimize_problem_size) for p in particles]
+            perturbed_costs = evaluator.cost_many(perturbed_particles, executor=executor)
+            for i in range(n_particles):
+                perturbed_particle = perturbed_particles[i]
 
                 # Calculate the energy difference
-                energy_diff = evaluator.cost(perturbed_particle) - evaluator.cost(particles[i])
+                energy_diff = perturbed_costs[i] - evaluator.cost(particles[i])
                 self.logger.write_msg(
-                    k+1, evaluator.get_counter(), evaluator.cost(perturbed_particle), perturbed_particle.get_compilation_flags(), flair=None,
+                    k+1, evaluator.get_counter(), perturbed_costs[i], perturbed_particle, flair=None,
                 )
 
                 # Update the particle or move to a new state with a certain probability
                 if energy_diff > 0 or acceptance_func(energy_diff, temp) > np.random.uniform():
                     particles[i] = perturbed_particle
-            # Update the particle weights based on the new states
-            particles = self.comm.gather(particles, root=0)
-
-            if my_rank == 0:
-                particles = ungroup_particles(particles)
-                for i in range(n_particles):
-                    particle_weights[i] = np.exp(evaluator.cost(particles[i])/temp)
 
-                # Normalize the weights
-                particle_weights /= np.sum(particle_weights)
+            # Update the particle weights based on the new states
+            for i in range(n_particles):
+                particle_weights[i] = np.exp(evaluator.cost(particles[i])/temp)
 
-                # Update the current state and current energy
-                best_particle = particles[np.argmax([evaluator.cost(p) for p in particles])]
-                best_energy = evaluator.cost(best_particle)
+            # Normalize the weights
+            particle_weights /= np.sum(particle_weights)
 
-                if best_energy > current_energy:
-                    current_state = best_particle
-                    current_energy = best_energy
-                    path.append((current_state, current_energy))
+            # Update the current state and current energy
+            best_particle = particles[np.argmax([evaluator.cost(p) for p in particles])]
+            best_energy = evaluator.cost(best_particle)
 
+            if best_energy > current_energy:
+                current_state = best_particle
+                current_energy = best_energy
+                path.append((current_state, current_energy))
 
             temp = self.f(temp)
             k += 1
+            self.save_state(k, (particles, particle_weights, current_state, current_energy, path, temp, k), evaluator)
+
+        if executor is not None:
+            executor.stop()
+        return current_state, current_energy, path
+
 
+class AsyncCuriousSimulatedAnnealing(CuriousSimulatedAnnealing):
+    """
+    Steady-state CSA: instead of synchronized rounds, every particle has its own evaluation in flight and is
+    advanced as soon as it returns (acceptance, then resampling of that particle only from the weights of the
+    current population), so no rank waits for the slowest evaluation of a round. The temperature follows the
+    completed evaluations, T0 * lambda^(k / popsize), i.e. the schedule of CSA with one round per popsize
+    evaluations, and exactly num_steps evaluations are made. Use popsize >= the number of ranks to keep all busy.
+    """
+    def run(self, num_steps, evaluator) -> None:
+        my_rank = self.comm.Get_rank()
+        executor = MPIExecutor(self.comm) if self.comm.Get_size() > 1 else None
         if my_rank != 0:
+            executor.serve(evaluator.evaluate)
             return None, None, None
-        return current_state, current_energy, path
 
+        n_particles = self.popsize
+        if n_particles < self.comm.Get_size():
+            self.logger.write_info(f'popsize {n_particles} leaves ranks idle, use at least {self.comm.Get_size()}')
+        state = self.load_state(evaluator)
+        if state is not None:
+            particles, particle_costs, current_state, current_energy, path, k = state
+        else:
+            init_state = get_random_solution(self.problem_size)
+            current_state = init_state
+            current_energy = evaluator.cost(init_state)
+            particles = [init_state for _ in range(n_particles)]
+            particle_costs = np.full(n_particles, current_energy, dtype=float)
+            path = [(current_state, current_energy)]
+            self.logger.write_msg(
+                0, evaluator.get_counter(), current_energy, current_state, flair='Initial'
+            )
+            k = 0
+
+        submitted = k  # evaluations in flight when a checkpoint was saved are made again
+        in_flight = {}  # particle index: perturbed particle being evaluated
+        completed = deque()
+
+        def propose(i):
+            nonlocal submitted
+            if submitted >= num_steps:
+                return
+            submitted += 1
+            in_flight[i] = particles[i].get_random_neighbor(self.optimize_problem_size)
+            if executor is None or evaluator.cached_cost(in_flight[i]) is not None:
+                completed.append((i, evaluator.evaluate(in_flight[i])))
+            else:
+                executor.submit(i, in_flight[i])
+
+        for i in range(n_particles):
+            propose(i)
+        while len(in_flight) > 0:
+            if len(completed) == 0:
+                completed.extend(executor.wait(evaluator.evaluate))
+            i, result = completed.popleft()
+            perturbed_particle = in_flight.pop(i)
+            cost = evaluator.accept(perturbed_particle, result)  # possibly measured by another rank
+            evaluator.set_cost(perturbed_particle, cost)
+            k += 1
+            temp = self.T0 * self.hparams['lambda'] ** (k / n_particles)
+
+            if cost > particle_costs[i] or acceptance_func(cost - particle_costs[i], temp) > np.random.uniform():
+                particles[i] = perturbed_particle
+                particle_costs[i] = cost
+            log_flair = None
+            if cost > current_energy:
+                current_state = perturbed_particle
+                current_energy = cost
+                path.append((current_state, current_energy))
+                log_flair = 'New best!'
+            self.logger.write_msg(
+                k, evaluator.get_counter(), cost, perturbed_particle, flair=log_flair,
+            )
+
+            # resamples this particle from the population (weights exp(cost / T), shifted to avoid overflows)
+            weights = np.exp((particle_costs - particle_costs.max()) / temp)
+            j = np.random.choice(n_particles, p=weights / weights.sum())
+            particles[i] = particles[j]
+            particle_costs[i] = particle_costs[j]
+            self.save_state(k, (particles, particle_costs, current_state, current_energy, path, k), evaluator)
+            propose(i)
+
+        if executor is not None:
+            executor.stop()
+        return current_state, current_energy, path
@@ -1,48 +1,72 @@
 import math
 
+from optimizer import wire
 from optimizer.algorithms import Algorithm
 from optimizer.random_solution import get_random_solution
 from optimizer.solution import Solution
+from optimizer.timing import timers
 
 
 class Greedy(Algorithm):
     def __init__(self, hparams, problem_size, comm, logger, optimize_problem_size) -> None:
         super().__init__(hparams, problem_size, comm, logger, optimize_problem_size)
+        self.register_surrogate_hyperparameters()
+        self.register_migration_hyperparameters()
+        self.parse_hyperparameters()
+        self.init_surrogate()
+        self.init_migration()
 
     def run(self, kmax, evaluator):
         self.logger.write_info('Starting greedy hill climbing')
-        Sbest = get_random_solution(self.problem_size)
-        Ebest = evaluator.cost(Sbest)
-        neighbors = Sbest.get_neighbors(self.optimize_problem_size)
-        k = 0
-        newBetterS = True
-        path = [(Sbest, Ebest)]
-        self.logger.write_msg(
-            k, evaluator.get_counter(), Ebest, Sbest.get_compilation_flags(), flair='Initial'
-        )
+        state = self.load_state(evaluator)
+        if state is not None:
+            Sbest, Ebest, neighbors, k, newBetterS, path = state
+        else:
+            Sbest = get_random_solution(self.problem_size)
+            Ebest = evaluator.cost(Sbest)
+            self.observe(Sbest, Ebest)
+            neighbors = self.screen_neighbors(Sbest.get_neighbors(self.optimize_problem_size))
+            k = 0
+            newBetterS = True
+            path = [(Sbest, Ebest)]
+            self.logger.write_msg(
+                k, evaluator.get_counter(), Ebest, Sbest, flair='Initial'
+            )
 
         while k < kmax and len(neighbors) > 0 and newBetterS:
-            S1 = neighbors.pop()
-            E1 = evaluator.cost(S1)
-            for S2 in neighbors:
-                E2 = evaluator.cost(S2)
+            costs = evaluator.cost_many(neighbors)
+            S1 = None
+            E1 = -math.inf
+            for S2, E2 in zip(neighbors, costs):
+                self.observe(S2, E2)
                 if E2 > E1:
                     S1 = S2
                     E1 = E2
             if E1 > Ebest:
                 Sbest = S1
                 Ebest = E1
-                neighbors = Sbest.get_neighbors(self.optimize_problem_size)
+                neighbors = self.screen_neighbors(Sbest.get_neighbors(self.optimize_problem_size))
                 path.append((Sbest, Ebest))
                 self.logger.write_msg(
-                    k+1, evaluator.get_counter(), Ebest, Sbest.get_compilation_flags(),
+                    k+1, evaluator.get_counter(), Ebest, Sbest,
                 )
             else:
                 newBetterS = False
                 self.logger.write_info("No better element. End of the loop")
 
             k = k+1
+            migrant = self.migrate(k, Sbest, Ebest, evaluator)
+            if migrant is not None:
+                Sbest, Ebest = migrant
+                neighbors = self.screen_neighbors(Sbest.get_neighbors(self.optimize_problem_size))
+                path.append((Sbest, Ebest))
+                newBetterS = True
+            self.save_state(k, (Sbest, Ebest, neighbors, k, newBetterS, path), evaluator)
         self.logger.write_info("End of the loop via number of iterations")
+        self.finish_migration()
+        self.report_surrogate()
+        # with the 'always' migration policy, the current solution can be worse than an earlier one
+        Sbest, Ebest = max(path, key=lambda point: point[1])
         return Sbest, Ebest, path    
 
 class TabuGreedy(Algorithm):
@@ -54,17 +78,21 @@ class TabuGreedy(Algorithm):
     def run(self, kmax, evaluator):
         self.logger.write_info('Starting tabu_greedy hill climbing')
         N_Tabu = self.hparams['n_tabu']
-        Sbest = get_random_solution(self.problem_size)
-        Ebest = evaluator.cost(Sbest)
-        neighbors = Sbest.get_neighbors(self.optimize_problem_size)
-        k = 0
-        path = [(Sbest, Ebest)]
-        self.logger.write_msg(
-            k, evaluator.get_counter(), Ebest, Sbest.get_compilation_flags(), flair='Initial'
-        )
-
-        newBetterS = True
-        visited = []
+        state = self.load_state(evaluator)
+        if state is not None:
+            Sbest, Ebest, neighbors, k, newBetterS, visited, path = state
+        else:
+            Sbest = get_random_solution(self.problem_size)
+            Ebest = evaluator.cost(Sbest)
+            neighbors = Sbest.get_neighbors(self.optimize_problem_size)
+            k = 0
+            path = [(Sbest, Ebest)]
+            self.logger.write_msg(
+                k, evaluator.get_counter(), Ebest, Sbest, flair='Initial'
+            )
+
+            newBetterS = True
+            visited = {}  # insertion-ordered, used as a FIFO set
 
         while k < kmax and newBetterS:
             S1, E1 = TabuFindBest(neighbors, visited, evaluator)
@@ -76,7 +104,7 @@ class TabuGreedy(Algorithm):
                 path.append((Sbest, Ebest))
 
                 self.logger.write_msg(
-                    k+1, evaluator.get_counter(), Ebest, Sbest.get_compilation_flags(),
+                    k+1, evaluator.get_counter(), Ebest, Sbest,
                 )
 
                 neighbors = Sbest.get_neighbors(self.optimize_problem_size)
@@ -86,61 +114,110 @@ class TabuGreedy(Algorithm):
                 self.logger.write_info("No better element. End of the loop")
 
             k = k+1
+            self.save_state(k, (Sbest, Ebest, neighbors, k, newBetterS, visited, path), evaluator)
 
         print("End of the loop via number of iterations")
         return Sbest, Ebest, path
 
 
-class parallelgreedy(Algorithm):
-    def __init__(self, hparams, problem_size) -> None:
-        super().__init__(hparams, problem_size)
+class ParallelGreedy(Algorithm):
+    """
+    Steepest ascent with the neighborhood shared out between ranks: the neighbors whose cost is unknown are split
+    between the ranks, measured concurrently and their costs exchanged, so every rank knows every cost and takes
+    the same move. Without tabu (n_tabu = 0) it stops at the first local optimum, like Greedy.
+    With n_tabu > 0 it is a tabu search: it always moves to the best admissible neighbor, even a worse one, and the
+    last n_tabu solutions visited are not admissible unless they beat the best solution found (aspiration).
+    """
+    shares_evaluations = True
 
-    def run(self, kmax, evaluator):
+    def __init__(self, hparams, problem_size, comm, logger, optimize_problem_size) -> None:
+        super().__init__(hparams, problem_size, comm, logger, optimize_problem_size)
+        self.register_hyperparameter('n_tabu', 0)
+        self.register_hyperparameter('aspiration', True, enabled_by='n_tabu')
+        self.parse_hyperparameters()
 
-        Sbest = get_random_solution(self.problem_size)
-        Ebest = evaluator.cost(Sbest)
-        neighbors = Sbest.get_neighbors(self.optimize_problem_size)
-        n = len(neighbors)
-        k = 0
-        newBetterS = True
-        tabE = [0 for i in range(n)]
-        print('Cost= ', Ebest, end=' ')
-        path = [(Sbest, Ebest)]
-        Sbest.display()
-
-        while k < kmax and n > 0 and newBetterS:
-            for i in range(n):
-                tabE[i] = evaluator.cost(neighbors[i])
-
-            j = 0
-            for i in range(n):
-                if tabE[i] > tabE[j]:
-                    j = i
-            E1 = tabE[j]
-            S1 = neighbors[j]
+    def share_costs(self, neighbors, evaluator):
+        """Every rank measures a share of the unknown neighbors, returns the costs of all of them"""
+        is_root = self.comm.Get_rank() == 0
+        # the costs known by the root (memory or results database) decide what is measured, so that all ranks
+        # split the same pending list even if the database is being filled in the meantime
+        with timers.phase('mpi_wait'):
+            known = self.comm.bcast([evaluator.cached_cost(S) for S in neighbors] if is_root else None)
+        pending = list(dict.fromkeys(S for S, E in zip(neighbors, known) if E is None))
+        costs = dict(zip(pending, wire.share_out(self.comm, pending, evaluator.cost_many)))
+        for S, E in zip(neighbors, known):
+            if E is not None:
+                costs[S] = E
+        for S, E in costs.items():
+            evaluator.set_cost(S, E)
+        return [costs[S] for S in neighbors]
 
-            if E1 > Ebest:
-                Sbest = S1
-                Ebest = E1
-                neighbors = Sbest.get_neighbors(self.optimize_problem_size)
-                path.append((Sbest, Ebest))
-                print('New best:', end=' ')
-                Sbest.display()
-                print('Actual Cost: ' + str(Ebest))
+    def run(self, kmax, evaluator):
+        is_root = self.comm.Get_rank() == 0
+        if is_root:
+            self.logger.write_info('Starting parallel greedy hill climbing')
+        N_Tabu = self.hparams['n_tabu']
+        state = self.load_shared_state(evaluator)
+        if state is not None:
+            S, E, Sbest, Ebest, k, newBetterS, tabu, path = state
+        else:
+            # same start on every rank
+            S = wire.bcast_solutions(self.comm, [get_random_solution(self.problem_size)])[0]
+            with timers.phase('mpi_wait'):
+                E = self.comm.bcast(evaluator.cost(S) if is_root else None)
+            evaluator.set_cost(S, E)
+            Sbest, Ebest = S, E
+            k = 0
+            newBetterS = True
+            tabu = {S.get_key(): None}  # insertion-ordered, used as a FIFO set
+            path = [(Sbest, Ebest)]
+            if is_root:
+                self.logger.write_msg(k, evaluator.get_counter(), E, S, flair='Initial')
 
+        while k < kmax and newBetterS:
+            neighbors = S.get_neighbors(self.optimize_problem_size)
+            costs = self.share_costs(neighbors, evaluator)
+            # first best admissible neighbor, the same on every rank
+            S1 = None
+            E1 = -math.inf
+            for S2, E2 in zip(neighbors, costs):
+                aspirated = self.hparams['aspiration'] and E2 > Ebest
+                if E2 > E1 and (N_Tabu == 0 or S2.get_key() not in tabu or aspirated):
+                    S1 = S2
+                    E1 = E2
+            if S1 is not None and (N_Tabu > 0 or E1 > E):
+                S, E = S1, E1
+                log_flair = None
+                if E > Ebest:
+                    Sbest, Ebest = S, E
+                    path.append((Sbest, Ebest))
+                    log_flair = 'New best!'
+                if N_Tabu > 0:
+                    tabu.pop(S.get_key(), None)
+                    tabu[S.get_key()] = None
+                    if len(tabu) > N_Tabu:
+                        del tabu[next(iter(tabu))]
+                if is_root:
+                    self.logger.write_msg(
+                        k+1, evaluator.get_counter(), E, S, flair=log_flair,
+                    )
             else:
                 newBetterS = False
-                print("\nNo better element. End of the loop")
+                if is_root:
+                    self.logger.write_info("No better (or admissible) element. End of the loop")
 
             k = k+1
-        print("End of the loop via number of iterations")
-        return Sbest, path
+            self.save_shared_state(k, (S, E, Sbest, Ebest, k, newBetterS, tabu, path), evaluator)
+
+        if not is_root:
+            return None, None, None  # every rank found the same solution
+        return Sbest, Ebest, path
 
 
 def FifoAdd(logger, Sbest, Ltabu, TabuSize=10):
     if len(Ltabu) == TabuSize:
-        Ltabu.pop(0)
-    Ltabu.append(Sbest)
+        del Ltabu[next(iter(Ltabu))]
+    Ltabu[Sbest] = None
 
     logger.write_info("Tabu List:")
     for i in Ltabu:
@@ -152,10 +229,10 @@ def FifoAdd(logger, Sbest, Ltabu, TabuSize=10):
 def TabuFindBest(Lneigh, Ltabu, evaluator):
     E1 = -math.inf
     S1 = None
-    for S2 in Lneigh:
-        if S2 not in Ltabu:
-            E2 = evaluator.cost(S2)
-            if E2 > E1:
-                S1 = S2
-                E1 = E2
+    candidates = [S2 for S2 in Lneigh if S2 not in Ltabu]
+    costs = evaluator.cost_many(candidates)
+    for S2, E2 in zip(candidates, costs):
+        if E2 > E1:
+            S1 = S2
+            E1 = E2
     return S1, E1
@@ -13,37 +13,57 @@ from optimizer.algorithms import Algorithm
 class HillClimbing(Algorithm):
     def __init__(self, hparams, problem_size, comm, logger, optimize_problem_size) -> None:
         super().__init__(hparams, problem_size, comm, logger, optimize_problem_size)
-        
+        self.register_surrogate_hyperparameters()
+        self.register_migration_hyperparameters()
+        self.parse_hyperparameters()
+        self.init_surrogate()
+        self.init_migration()
+
     def run(self, num_steps, evaluator):
         self.logger.write_info('Starting hill_climbing')
-        Sbest = get_random_solution(self.problem_size)
-        Ebest = evaluator.cost(Sbest)
-        neighbors = Sbest.get_neighbors(self.optimize_problem_size)
-        k = 0
-        path = [(Sbest, Ebest)]
-        self.logger.write_msg(
-            k, evaluator.get_counter(), Ebest, Sbest.get_compilation_flags(), flair='Initial'
-        )
+        state = self.load_state(evaluator)
+        if state is not None:
+            Sbest, Ebest, neighbors, k, path = state
+        else:
+            Sbest = get_random_solution(self.problem_size)
+            Ebest = evaluator.cost(Sbest)
+            self.observe(Sbest, Ebest)
+            neighbors = self.screen_neighbors(Sbest.get_neighbors(self.optimize_problem_size))
+            k = 0
+            path = [(Sbest, Ebest)]
+            self.logger.write_msg(
+                k, evaluator.get_counter(), Ebest, Sbest, flair='Initial'
+            )
         while k < num_steps and len(neighbors) > 0:
             selected_index = random.randint(0, len(neighbors)-1)
             S_new = neighbors[selected_index]
             neighbors.pop(selected_index)
             E_new = evaluator.cost(S_new)
+            self.observe(S_new, E_new)
             if E_new > Ebest:
                 log_flair = 'New best!'
                 Ebest = E_new
                 Sbest = S_new
                 path.append((Sbest, Ebest))
-                neighbors = Sbest.get_neighbors(self.optimize_problem_size)
+                neighbors = self.screen_neighbors(Sbest.get_neighbors(self.optimize_problem_size))
             else:
                 log_flair = None
             k += 1
 
             self.logger.write_msg(
-                k, evaluator.get_counter(), E_new, S_new.get_compilation_flags(), flair=log_flair
+                k, evaluator.get_counter(), E_new, S_new, flair=log_flair
             )
+            migrant = self.migrate(k, Sbest, Ebest, evaluator)
+            if migrant is not None:
+                Sbest, Ebest = migrant
+                path.append((Sbest, Ebest))
+                neighbors = self.screen_neighbors(Sbest.get_neighbors(self.optimize_problem_size))
+            self.save_state(k, (Sbest, Ebest, neighbors, k, path), evaluator)
         if len(neighbors) <= 0:
             self.logger.write_info(
                 'Algorithm exited: Best solution neighborhood was fully explored ')
-
+        self.finish_migration()
+        self.report_surrogate()
+        # with the 'always' migration policy, the current solution can be worse than an earlier one
+        Sbest, Ebest = max(path, key=lambda point: point[1])
         return Sbest, Ebest, path
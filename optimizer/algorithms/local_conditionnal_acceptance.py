@@ -10,7 +10,11 @@ class LocalConditionnalAcceptance(Algorithm):
         super().__init__(hparams, problem_size, comm, logger, optimize_problem_size)
         self.register_hyperparameter('t0', 100)
         self.register_hyperparameter('lambda', 0.9)
+        self.register_surrogate_hyperparameters()
+        self.register_migration_hyperparameters()
         self.parse_hyperparameters()
+        self.init_surrogate()
+        self.init_migration()
 
         self.T0 = self.hparams['t0']
         # TODO: current temperature function is hard coded
@@ -20,27 +24,33 @@ class LocalConditionnalAcceptance(Algorithm):
         self.logger.write_info('Starting simulated_annealing')
         T0 = self.T0
         f = self.f
-        S_best = get_random_solution(self.problem_size)
-        E_best = evaluator.cost(S_best)
-        S = S_best
-        E = E_best
-        neighbors = S_best.get_neighbors(self.optimize_problem_size)
-        path = [(S_best, E_best)]
-        T = T0
-        k = 0
-        self.logger.write_msg(
-            k, evaluator.get_counter(), E, S.get_compilation_flags(), flair='Initial'
-        )
+        state = self.load_state(evaluator)
+        if state is not None:
+            S_best, E_best, S, E, neighbors, path, T, k = state
+        else:
+            S_best = get_random_solution(self.problem_size)
+            E_best = evaluator.cost(S_best)
+            self.observe(S_best, E_best)
+            S = S_best
+            E = E_best
+            neighbors = self.screen_neighbors(S_best.get_neighbors(self.optimize_problem_size))
+            path = [(S_best, E_best)]
+            T = T0
+            k = 0
+            self.logger.write_msg(
+                k, evaluator.get_counter(), E, S, flair='Initial'
+            )
         while k < kmax > 0:
             selected_index = random.randint(0, len(neighbors)-1)
             S_new = neighbors[selected_index]
             E_new = evaluator.cost(S_new)
+            self.observe(S_new, E_new)
             if E_new > E or random.uniform(0, 1) < math.exp((E_new-E)/T):
                 if E_new <= E:
                     log_flair = 'Risky choice !'
                 S = S_new
                 E = E_new
-                neighbors = S.get_neighbors(self.optimize_problem_size)
+                neighbors = self.screen_neighbors(S.get_neighbors(self.optimize_problem_size))
                 if E > E_best:
                     S_best = S
                     E_best = E
@@ -51,6 +61,18 @@ class LocalConditionnalAcceptance(Algorithm):
             T = f(T)
             k += 1
             self.logger.write_msg(
-                k, evaluator.get_counter(), E_new, S_new.get_compilation_flags(), log_flair,
+                k, evaluator.get_counter(), E_new, S_new, log_flair,
             )
+            # the best solutions migrate, they replace the current one (the chain goes on from there)
+            migrant = self.migrate(k, S_best, E_best, evaluator)
+            if migrant is not None:
+                S, E = migrant
+                neighbors = self.screen_neighbors(S.get_neighbors(self.optimize_problem_size))
+                if E > E_best:
+                    S_best = S
+                    E_best = E
+                    path.append((S_best, E_best))
+            self.save_state(k, (S_best, E_best, S, E, neighbors, path, T, k), evaluator)
+        self.finish_migration()
+        self.report_surrogate()
         return S_best, E_best, path
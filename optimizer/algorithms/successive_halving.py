@@ -0,0 +1,95 @@
+import math
+from functools import partial
+
+import numpy as np
+
+from optimizer.random_solution import get_random_solution
+from optimizer import wire
+from optimizer.algorithms import Algorithm
+
+
+class SuccessiveHalving(Algorithm):
+    """
+    Multi-fidelity screening of random configurations. A bracket starts with many candidates measured at a low
+    fidelity (a fraction of the iterations and/or of the grid, see BaseEvaluator.program_arguments); only the best
+    1/eta of them are promoted to the next rung, measured eta times longer, until the survivors are measured at
+    full fidelity. With hyperband, brackets starting at every fidelity level share the budget, which hedges
+    against low fidelities being misleading.
+    num_steps is the budget in full-fidelity runs. All ranks work on the same brackets: the candidates of each rung
+    are shared out between them and the costs exchanged.
+    """
+    shares_evaluations = True
+
+    def __init__(self, hparams, problem_size, comm, logger, optimize_problem_size) -> None:
+        super().__init__(hparams, problem_size, comm, logger, optimize_problem_size)
+        self.register_hyperparameter('eta', 3)
+        self.register_hyperparameter('min_fidelity', 0.1)
+        self.register_hyperparameter('hyperband', False)
+        self.parse_hyperparameters()
+        # rungs of the most aggressive bracket: fidelities min_fidelity * eta^i up to 1
+        self.max_rungs = int(math.log(1 / self.hparams['min_fidelity'], self.hparams['eta']) + 1e-9) + 1
+
+    def get_fidelities(self, num_rungs):
+        eta = self.hparams['eta']
+        return [eta ** (rung - num_rungs + 1) for rung in range(num_rungs)]
+
+    def get_brackets(self, num_steps):
+        """Number of rungs and candidates of every bracket, each bracket getting an equal part of the budget"""
+        rung_counts = range(self.max_rungs, 0, -1) if self.hparams['hyperband'] else [self.max_rungs]
+        budget = num_steps / len(rung_counts)
+        brackets = []
+        for num_rungs in rung_counts:
+            # every rung costs about num_candidates * lowest fidelity full-fidelity runs
+            fidelities = self.get_fidelities(num_rungs)
+            num_candidates = max(1, int(budget / (num_rungs * fidelities[0])))
+            brackets.append((num_rungs, num_candidates))
+        return brackets
+
+    def share_costs(self, candidates, evaluator, fidelity):
+        """Every rank measures a share of the candidates, returns the costs of all of them"""
+        costs = wire.share_out(self.comm, candidates, partial(evaluator.cost_many, fidelity=fidelity))
+        for solution, cost in zip(candidates, costs):
+            evaluator.set_cost(solution, cost, fidelity)
+        return costs
+
+    def run(self, num_steps, evaluator):
+        self.logger.write_info('Starting successive_halving')
+        eta = self.hparams['eta']
+        brackets = self.get_brackets(num_steps)
+        state = self.load_shared_state(evaluator)
+        if state is not None:
+            first_bracket, Sbest, Ebest, k, path, evaluator.fidelity_costs = state
+        else:
+            first_bracket, Sbest, Ebest, k, path = 0, None, None, 0, []
+
+        for bracket in range(first_bracket, len(brackets)):
+            num_rungs, num_candidates = brackets[bracket]
+            # same candidates on every rank (seeds differ between ranks)
+            candidates = wire.bcast_solutions(
+                self.comm, list(dict.fromkeys(get_random_solution(self.problem_size) for _ in range(num_candidates)))
+            )
+            if self.comm.Get_rank() == 0:
+                self.logger.write_info(f'Bracket {bracket}: {len(candidates)} candidates, {num_rungs} rungs')
+            for fidelity in self.get_fidelities(num_rungs):
+                costs = self.share_costs(candidates, evaluator, fidelity)
+                for solution, cost in zip(candidates, costs):
+                    k += 1
+                    log_flair = None
+                    if fidelity == 1 and (Ebest is None or cost > Ebest):
+                        Sbest, Ebest = solution, cost
+                        path.append((Sbest, Ebest))
+                        log_flair = 'New best!'
+                    if self.comm.Get_rank() == 0:
+                        self.logger.write_msg(
+                            k, evaluator.get_counter(), cost, solution,
+                            flair=log_flair if fidelity == 1 else f'fidelity {fidelity:.3g}'
+                        )
+                # keeps the best 1/eta (stable order, so every rank keeps the same ones)
+                num_kept = max(1, len(candidates) // eta)
+                order = np.argsort(-np.array(costs), kind='stable')[:num_kept]
+                candidates = [candidates[i] for i in sorted(order)]
+            self.save_shared_state(bracket + 1, (bracket + 1, Sbest, Ebest, k, path, evaluator.fidelity_costs), evaluator)
+
+        if self.comm.Get_rank() != 0:
+            return None, None, None  # every rank found the same solution
+        return Sbest, Ebest, path
@@ -0,0 +1,122 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from optimizer.solution import Solution
+from optimizer.solution_space import SolutionSpace
+from optimizer.algorithms import Algorithm
+
+
+class Sweep(Algorithm):
+    """
+    Exhaustive evaluation of the search space, used as ground truth for the heuristics.
+    The space is enumerated as an integer array of SolutionSpace indices (see Solution.get_indices), sorted so that
+    points sharing a binary are contiguous, optionally sub-sampled with a stride and sharded across MPI ranks.
+    Each run evaluates at most num_steps points per rank; with checkpointing, progress is saved to
+    {checkpoint}.rank{rank}.json so that a run with --resume continues the sweep, even with a different number of
+    ranks. The files record what the costs depend on (shape, program source, ...) and are only reused if it matches.
+    """
+    def __init__(self, hparams, problem_size, comm, logger, optimize_problem_size) -> None:
+        super().__init__(hparams, problem_size, comm, logger, optimize_problem_size)
+        self.register_hyperparameter('stride', 1)
+        self.register_hyperparameter('batch_size', 16)
+        self.parse_hyperparameters()
+
+    def get_shapes(self):
+        """Problem shapes to sweep, as index triples into SolutionSpace.problem_size"""
+        shape = tuple(SolutionSpace.problem_size.index(size) for size in self.problem_size)
+        if not self.optimize_problem_size:
+            return np.array([shape])
+        volume = np.prod(self.problem_size)
+        sizes = np.array(SolutionSpace.problem_size)
+        x, y, z = np.meshgrid(*[np.arange(len(sizes))] * 3, indexing='ij')
+        same_volume = sizes[x] * sizes[y] * sizes[z] == volume
+        return np.stack([x[same_volume], y[same_volume], z[same_volume]], axis=1)
+
+    def get_space(self):
+        """Every point of the space as an (n, 8) integer array, points that share a binary being contiguous"""
+        shapes = self.get_shapes()
+        grid = np.meshgrid(
+            np.arange(len(SolutionSpace.o_levels)),
+            np.arange(len(SolutionSpace.simds)),
+            np.arange(len(shapes)),
+            np.arange(len(SolutionSpace.nthreads)),
+            np.arange(len(SolutionSpace.threadblocks)),
+            np.arange(len(SolutionSpace.threadblocks)),
+            indexing='ij',
+        )
+        olevel, simd, shape, nthreads, thrdblock_y, thrdblock_z = [axis.ravel() for axis in grid]
+        points = np.column_stack([olevel, simd, shapes[shape], nthreads, thrdblock_y, thrdblock_z])
+        return points[::self.hparams['stride']]
+
+    def checkpoint_file(self, rank=None):
+        rank = self.comm.Get_rank() if rank is None else rank
+        return f'{self.checkpoint_path}.rank{rank}.json'
+
+    def get_sweep_key(self, num_points, evaluator):
+        """Everything the costs of the points depend on"""
+        return {
+            'stride': self.hparams['stride'],
+            'num_points': num_points,
+            'problem_size': [int(size) for size in self.problem_size],
+            'flexible_shape': bool(self.optimize_problem_size),
+            'evaluator': type(evaluator).__name__,
+            'source_hash': evaluator.source_hash,
+            'iterations': evaluator.iterations,
+        }
+
+    def load_checkpoints(self, key):
+        """Costs already measured by previous runs (of any rank), by point index"""
+        costs = {}
+        if not self.resume or self.checkpoint_path is None:
+            return costs
+        for file_name in glob.glob(f'{self.checkpoint_path}.rank*.json'):
+            with open(file_name) as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('key') != key:
+                raise Exception(f'Checkpoint {file_name} belongs to a different sweep '
+                                f'({checkpoint.get("key")}), use another --checkpoint prefix')
+            costs.update({int(i): cost for i, cost in checkpoint['costs'].items()})
+        return costs
+
+    def save_checkpoint(self, costs, key):
+        if self.checkpoint_path is None or self.checkpoint_interval <= 0:
+            return
+        file_name = self.checkpoint_file()
+        with open(file_name + '.tmp', 'w') as f:
+            json.dump({'key': key, 'costs': costs}, f)
+        os.replace(file_name + '.tmp', file_name)
+
+    def run(self, num_steps, evaluator):
+        self.logger.write_info('Starting sweep')
+        my_rank = self.comm.Get_rank()
+        points = self.get_space()
+        key = self.get_sweep_key(len(points), evaluator)
+        done = self.load_checkpoints(key)
+        # points evaluated by this rank, previous checkpoints of this rank are kept in its file
+        my_costs = {i: cost for i, cost in done.items() if i % self.comm.Get_size() == my_rank}
+        todo = [i for i in range(my_rank, len(points), self.comm.Get_size()) if i not in done][:num_steps]
+        self.logger.write_info(f'{len(points)} points, {len(done)} already evaluated, {len(todo)} to evaluate here')
+
+        k = 0
+        for start in range(0, len(todo), self.hparams['batch_size']):
+            batch = todo[start:start + self.hparams['batch_size']]
+            solutions = [Solution.from_indices(points[i]) for i in batch]
+            costs = evaluator.cost_many(solutions)
+            for i, solution, cost in zip(batch, solutions, costs):
+                k += 1
+                my_costs[i] = cost
+                self.logger.write_msg(k, evaluator.get_counter(), cost, solution)
+            self.save_checkpoint(my_costs, key)
+
+        if len(my_costs) == 0:
+            return None, None, None
+        # the path is the sequence of improvements in sweep order
+        path = []
+        for i in sorted(my_costs):
+            if len(path) == 0 or my_costs[i] > path[-1][1]:
+                path.append((Solution.from_indices(points[i]), my_costs[i]))
+        Sbest, Ebest = path[-1]
+        return Sbest, Ebest, path
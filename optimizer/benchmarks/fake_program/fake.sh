@@ -0,0 +1,9 @@
+#!/bin/sh
+# Arguments like iso3dfd: n1 n2 n3 nthreads iterations n1_thrd_block n2_thrd_block n3_thrd_block.
+# Synthetic landscape: better with -Ofast and wider simd, best threadblocks around (6, 9), plus deterministic
+# noise that shrinks with the number of iterations.
+awk -v o="@OLEVEL@" -v s="@SIMD@" -v n="$1" -v it="$5" -v y="$7" -v z="$8" 'BEGIN {
+    srand(y * 37 + z + it * 1000 + n)
+    t = 1000 + 10 * length(o) + 5 * length(s) - (y - 6) ^ 2 - (z - 9) ^ 2 + (rand() - 0.5) * 200 / it
+    printf "throughput: %.2f\n", t
+}'
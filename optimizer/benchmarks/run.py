@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mpi4py import MPI
+
+from optimizer import evaluators, wire
+from optimizer.executors import MPIExecutor
+from optimizer.logger import Logger
+from optimizer.random_solution import get_random_solution
+from optimizer.solution import Solution
+
+FAKE_PROGRAM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_program')
+
+
+def measure(function, calls, rounds=5):
+    """Seconds per call of function(), median and minimum over several rounds of `calls` calls"""
+    per_call = []
+    for _ in range(rounds):
+        start_time = time.perf_counter()
+        for _ in range(calls):
+            function()
+        per_call.append((time.perf_counter() - start_time) / calls)
+    return {'median': statistics.median(per_call), 'min': min(per_call), 'calls': calls, 'rounds': rounds}
+
+
+def bench_solutions(scale):
+    solution = get_random_solution([256, 256, 256])
+    return {
+        'get_neighbors': measure(lambda: solution.get_neighbors(False), 1000 * scale),
+        'get_neighbors_with_shapes': measure(lambda: solution.get_neighbors(True), 1000 * scale),
+        'get_modified_copy': measure(lambda: solution.get_modified_copy(thrdblock_y=7), 10000 * scale),
+        'new_solution': measure(lambda: Solution('-O3', 'avx2', 256, 256, 256, 16, 256, 4, 4), 10000 * scale),
+    }
+
+
+def bench_executor(scale):
+    """Round trip of a batch through the executor of csa and cmaes on a single rank (evaluated by its thread)"""
+    solutions = [get_random_solution([256, 256, 256]) for _ in range(16)]
+
+    def executor_map():
+        executor = MPIExecutor(MPI.COMM_SELF, poll_interval=0)
+        executor.map(lambda solution: 0.0, solutions)
+        executor.stop()
+    return {'executor_map_16_self': measure(executor_map, 10 * scale)}
+
+
+def bench_logging(scale, directory):
+    results = {}
+    for asynchronous in (True, False):
+        logger = Logger(0, logfile=os.path.join(directory, 'bench.log'), save_to_terminal=False,
+                        events_file=os.path.join(directory, 'bench.events.jsonl'), asynchronous=asynchronous)
+        solution = get_random_solution([256, 256, 256])
+        mode = 'async' if asynchronous else 'sync'
+
+        def write():
+            for k in range(100):
+                logger.write_msg(k, k, 1000.0, solution)
+
+        def write_and_flush():
+            write()
+            logger.flush()
+        # per message: time spent by the caller, then including the time to get it on disk
+        for key, function in ((f'write_msg_{mode}', write), (f'write_msg_{mode}_flushed', write_and_flush)):
+            result = measure(function, 10 * scale)
+            results[key] = {key: value / 100 if key in ('median', 'min') else value for key, value in result.items()}
+            logger.flush()
+        logger.close()
+    return results
+
+
+def bench_evaluator(scale, program_path):
+    logger = Logger(0, save_to_logfile=False, save_to_terminal=False)
+    evaluator = evaluators.NaiveEvaluator(program_path, evaluators.Simulator(logger))
+    solution = get_random_solution([256, 256, 256])
+    evaluator.cost(solution)  # builds the binary
+    executable_path = evaluator.binaries.get(solution.olevel, solution.simd)
+    return {
+        # cost of starting any process, the floor of the evaluations
+        'spawn_true': measure(lambda: subprocess.run(['true']), 20 * scale),
+        'run_program': measure(lambda: subprocess.run([executable_path] + evaluator.program_arguments(solution),
+                                                      capture_output=True), 20 * scale),
+        'evaluator_cost': measure(lambda: evaluator.cost(solution, ignore_cache=True), 20 * scale),
+        'evaluator_cached_cost': measure(lambda: evaluator.cost(solution), 10000 * scale),
+    }
+
+
+def bench_mpi(scale, comm):
+    """Communication patterns of the algorithms, timed on every rank (all ranks must call it)"""
+    solutions = [get_random_solution([256, 256, 256]) for _ in range(16)]
+    results = {
+        # final gathers of run_algorithm, racing and successive_halving rounds
+        'allgather_solution': measure(lambda: comm.allgather(solutions[0]), 100 * scale),
+        'allgather_costs_16': measure(lambda: comm.allgather([1000.0] * 16), 100 * scale),
+        # candidates of successive_halving
+        'bcast_solutions_16': measure(lambda: comm.bcast(solutions), 100 * scale),
+        # same broadcast with the buffer-based wire format
+        'wire_bcast_solutions_16': measure(lambda: wire.bcast_solutions(comm, solutions), 100 * scale),
+        'barrier': measure(comm.Barrier, 100 * scale),
+    }
+
+    # round trip of a batch through the master/worker executor of csa and cmaes, without and with evaluations on
+    # the root (as csa and cmaes run it)
+    def executor_map(evaluate_on_root):
+        executor = MPIExecutor(comm, evaluate_on_root=evaluate_on_root, poll_interval=0)
+        if comm.Get_rank() == 0:
+            executor.map(lambda solution: 0.0, solutions)
+            executor.stop()
+        else:
+            executor.serve(lambda solution: 0.0)
+    results['executor_map_16'] = measure(lambda: executor_map(False), 10 * scale)
+    results['executor_map_16_root'] = measure(lambda: executor_map(True), 10 * scale)
+    return results
+
+
+def get_commit():
+    result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                            cwd=os.path.dirname(FAKE_PROGRAM))
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks of the optimizer overhead')
+    parser.add_argument('--output', type=str, default='benchmarks.json', help='JSON file receiving the results')
+    parser.add_argument('--scale', type=int, default=1, help='Multiplies the number of calls of every benchmark')
+    parser.add_argument('--program_path', type=str, default=None,
+                        help='Program used by the evaluator benchmarks (default: a copy of the stand-in program)')
+    args = parser.parse_args()
+
+    comm = MPI.COMM_WORLD
+    results = {}
+    if comm.Get_rank() == 0:
+        directory = tempfile.mkdtemp()
+        program_path = args.program_path
+        if program_path is None:
+            program_path = shutil.copytree(FAKE_PROGRAM, os.path.join(directory, 'fake_program'))
+        results['solution'] = bench_solutions(args.scale)
+        results['executor'] = bench_executor(args.scale)
+        results['logging'] = bench_logging(args.scale, directory)
+        results['evaluator'] = bench_evaluator(args.scale, program_path)
+        shutil.rmtree(directory)
+    if comm.Get_size() > 1:
+        results['mpi'] = bench_mpi(args.scale, comm)
+
+    if comm.Get_rank() == 0:
+        report = {
+            'timestamp': time.time(),
+            'commit': get_commit(),
+            'host': platform.node(),
+            'python': sys.version.split()[0],
+            'mpi_ranks': comm.Get_size(),
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        for group, benchmarks in results.items():
+            for name, result in benchmarks.items():
+                print(f"{group + '.' + name:<40}{result['median'] * 1e6:>14.2f} us/call")
@@ -0,0 +1,88 @@
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from optimizer.results_db import hash_program_source
+from optimizer.timing import timers
+
+
+class BinaryCache:
+    """
+    Compiles each (olevel, simd) variant of the program once and reuses it for every runtime parameter.
+    Binaries are stored in the program's bin/ folder under a name that contains the source hash,
+    so they are shared by all runs and ranks as long as the source code does not change.
+    """
+    def __init__(self, program_path) -> None:
+        self.program_path = program_path
+        self.source_hash = hash_program_source(program_path)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def get_executable_name(self, olevel, simd):
+        return f'{olevel.lstrip("-")}_{simd}_{self.source_hash[:12]}.exe'
+
+    def get_executable_path(self, olevel, simd):
+        return f'{self.program_path}/bin/{self.get_executable_name(olevel, simd)}'
+
+    def is_built(self, olevel, simd):
+        return os.path.exists(self.get_executable_path(olevel, simd))
+
+    def get(self, olevel, simd):
+        """Returns the path of the executable, compiling it first if needed"""
+        executable_path = self.get_executable_path(olevel, simd)
+        with self._get_lock(olevel, simd):
+            if not os.path.exists(executable_path):
+                self.build(olevel, simd)
+        return executable_path
+
+    def build(self, olevel, simd):
+        # compile under a temporary name and rename it, so other processes never see a partial binary
+        final_name = self.get_executable_name(olevel, simd)
+        temporary_name = f'tmp_{os.getpid()}_{threading.get_ident()}_{final_name}'
+        with timers.phase('compile'):
+            result = subprocess.run(
+                ['make', '-C', self.program_path, f'Olevel={olevel}', f'simd={simd}', 'last'],
+                stdout=subprocess.DEVNULL,
+                env=dict(os.environ, CONFIG_EXE_NAME=temporary_name))
+        if result.returncode != 0:
+            raise Exception(f'Failed compiling: {result.returncode}')
+        os.replace(f'{self.program_path}/bin/{temporary_name}', f'{self.program_path}/bin/{final_name}')
+
+    def smoke_test(self, olevel, simd):
+        """Runs the binary on a tiny problem to detect ISA flags unsupported by this node"""
+        result = subprocess.run([self.get(olevel, simd), '32', '32', '32', '1', '1', '32', '1', '1'],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode != 0:
+            raise Exception(f'Failed executing: {result.returncode}')
+
+    def prebuild(self, variants, workers=None, comm=None):
+        """
+        Compiles the (olevel, simd) variants concurrently and checks that each one runs on this node.
+        With a communicator, builds are distributed across ranks (binaries are shared through the file system)
+        and every rank smoke tests all variants. Returns the variants that failed on any rank.
+        """
+        my_variants = variants if comm is None else variants[comm.Get_rank()::comm.Get_size()]
+        # builds are external make processes, so threads are enough to keep all cores busy
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            build_errors = list(pool.map(lambda variant: self._try(self.get, variant), my_variants))
+        failed = [variant for variant, error in zip(my_variants, build_errors) if error is not None]
+        if comm is not None:
+            failed = [variant for rank_failed in comm.allgather(failed) for variant in rank_failed]
+        for variant in variants:
+            if variant not in failed and self._try(self.smoke_test, variant) is not None:
+                failed.append(variant)
+        if comm is not None:
+            failed = [variant for rank_failed in comm.allgather(failed) for variant in rank_failed]
+        return sorted(set(failed))
+
+    def _try(self, function, variant):
+        try:
+            function(*variant)
+        except Exception as e:
+            return e
+        return None
+
+    def _get_lock(self, olevel, simd):
+        with self._locks_guard:
+            return self._locks.setdefault((olevel, simd), threading.Lock())
@@ -42,7 +42,9 @@ echo "================================="
 def print_args(args):
     s = ''
     for k, v in sorted(vars(args).items()):
-        if type(v) == bool:
+        if v is None:
+            continue
+        elif type(v) == bool:
             s += f'--{k} ' if v else ''
         elif type(v) == list:
             str_v = [str(x) for x in v]
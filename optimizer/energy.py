@@ -0,0 +1,71 @@
+import glob
+import os
+import threading
+
+
+class RaplMeter:
+    """
+    Energy meter reading the Linux powercap (RAPL) counters of every package and its DRAM domain.
+    Between start() and stop(), a background thread reads the counters every `interval` seconds and accumulates
+    the increments, so that counter wraparounds (after max_energy_range_uj) are not missed on long runs.
+    The counters cover the whole node: concurrent evaluations on the same node are measured together.
+    Reading energy_uj usually requires root.
+    """
+    def __init__(self, root='/sys/class/powercap', interval=1.0) -> None:
+        self.root = root
+        self.interval = interval
+        self.zones = self.find_zones()
+        if len(self.zones) == 0:
+            raise Exception(f'No RAPL package found in {root}')
+        self._thread = None
+        self._stop = threading.Event()
+
+    def find_zones(self):
+        """Returns {label: (energy file, counter range)} with labels like package-0 and dram-0"""
+        zones = {}
+        for package in sorted(glob.glob(os.path.join(self.root, 'intel-rapl:*'))):
+            name = read_value(package, 'name', str)
+            if not name.startswith('package-'):
+                continue
+            zones[name] = package
+            index = name.split('-')[1]
+            for domain in sorted(glob.glob(package + '/intel-rapl:*:*')):
+                if read_value(domain, 'name', str) == 'dram':
+                    zones[f'dram-{index}'] = domain
+        return {label: (os.path.join(path, 'energy_uj'), read_value(path, 'max_energy_range_uj', int))
+                for label, path in zones.items()}
+
+    def read(self):
+        return {label: read_value(energy_file, None, int) for label, (energy_file, _) in self.zones.items()}
+
+    def _accumulate(self):
+        counters = self.read()
+        for label, value in counters.items():
+            increment = value - self._last[label]
+            if increment < 0:  # the counter wrapped around
+                increment += self.zones[label][1]
+            self._energy[label] += increment
+        self._last = counters
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._accumulate()
+
+    def start(self):
+        self._energy = {label: 0 for label in self.zones}
+        self._last = self.read()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Returns the energy consumed since start(), in joules, by zone"""
+        self._stop.set()
+        self._thread.join()
+        self._accumulate()
+        return {label: energy / 1e6 for label, energy in self._energy.items()}
+
+
+def read_value(path, file_name, convert):
+    with open(path if file_name is None else os.path.join(path, file_name)) as f:
+        return convert(f.read().strip())
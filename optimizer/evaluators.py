@@ -1,13 +1,27 @@
 import subprocess
 import re
-import threading
 import os
-import pandas as pd
+import threading
+import time
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
 
+from optimizer.build_cache import BinaryCache
+from optimizer.energy import RaplMeter
+from optimizer.executors import SerialExecutor
+from optimizer.pareto import ParetoArchive
+from optimizer.results_db import ResultsDatabase
+from optimizer.solution import Solution
+from optimizer.surrogate import SurrogateModel
+from optimizer.timing import timers
+
+DEFAULT_ITERATIONS = 100  # runs of this length are stored under the compilation flags alone
+
 class Simulator:
     def __init__(self, logger, run_counter=0, solutions_counter=0) -> None:
         logger.write_info('Simulator initialized')
+        self.logger = logger
         self.run_counter = run_counter  # counts how many solutions were evaluated in a run
         self.sol_counter = solutions_counter  # counts how many solutions were instanced in a run
 
@@ -23,168 +37,428 @@ class Simulator:
 
 
 class BaseEvaluator:
-    def __init__(self, program_path, evaluation_session):
+    """
+    Measures the cost of solutions. Costs can also be measured at a reduced fidelity (a fraction of the work of
+    a full run, see program_arguments): such costs are only comparable between themselves, so they are cached
+    apart from the full-fidelity cost held by the solution.
+    """
+    uses_energy = False
+
+    def __init__(self, program_path, evaluation_session, results_db=None, iterations=DEFAULT_ITERATIONS,
+                 fidelity_on='iterations'):
         self.program_path = program_path
+        self.iterations = iterations  # time steps of a full-fidelity run
+        self.fidelity_on = fidelity_on  # what a reduced fidelity scales down: 'iterations', 'grid' or 'both'
+        self.fidelity_costs = {}  # (solution, fidelity) -> cost, for fidelities below 1
         self.evaluation_session = evaluation_session
+        self.results_db = results_db
+        self.binaries = BinaryCache(program_path) if program_path is not None else None  # None: nothing to build
+        self.source_hash = self.binaries.source_hash if self.binaries is not None else None
+        self.executor = SerialExecutor()
+        self._measure_pool = None
+        self._build_pool = None
+        self.objectives = {}  # raw objectives of the measured solutions, when the cost combines several of them
+        self.pareto = None  # ParetoArchive of the objectives (throughput, -energy)
+        self._objectives_lock = threading.Lock()
 
     def get_counter(self):
         return self.evaluation_session.run_counter
 
+    def cost(self, solution, verbose=False, num_evaluations=1, ignore_cache=False, affinity='balanced', fidelity=1):
+        raise NotImplementedError
+
+    def cost_from_samples(self, samples):
+        raise NotImplementedError
+
+    def objectives_from_samples(self, samples):
+        return None  # single objective
+
+    def evaluate(self, solution, fidelity=1):
+        """Cost and objectives of a solution, what executors send back when they evaluate in another process"""
+        cost = self.cost(solution, fidelity=fidelity)
+        return cost, self.objectives.get(solution)
+
+    def accept(self, solution, result):
+        """Cost of a solution evaluated in another process, from what evaluate() returned there"""
+        cost, objectives = result
+        self.add_objectives(solution, objectives)
+        return cost
+
+    def add_objectives(self, solution, objectives):
+        """Remembers the first measured objectives of a solution and adds it to the Pareto archive"""
+        if objectives is None or solution in self.objectives:
+            return
+        with self._objectives_lock:
+            self.objectives[solution] = objectives
+            if self.pareto is not None:
+                throughput, energy = objectives
+                self.pareto.add(solution, (throughput, -energy))
+
+    def cached_cost(self, solution, fidelity=1):
+        """Returns the cost if it is known without running the program (in memory or in the database), else None"""
+        if fidelity != 1:
+            if (solution, fidelity) not in self.fidelity_costs:
+                samples = self.lookup_samples(solution, self.uses_energy, fidelity)
+                if samples is not None:
+                    self.fidelity_costs[(solution, fidelity)] = self.cost_from_samples(samples)
+            return self.fidelity_costs.get((solution, fidelity))
+        if solution.calculated_cost is None:
+            samples = self.lookup_samples(solution, with_energy=self.uses_energy)
+            if samples is not None:
+                solution.calculated_cost = self.cost_from_samples(samples)
+                self.add_objectives(solution, self.objectives_from_samples(samples))
+        return solution.calculated_cost
+
+    def cost_many(self, solutions, executor=None, fidelity=1):
+        """
+        Evaluates a batch of solutions and returns their costs in the same order. Duplicates and cached solutions
+        are resolved first, the remaining ones are grouped by binary and dispatched to the executor
+        (the evaluator's own executor by default, or the pipeline when it is enabled).
+        MPI workers evaluate with the function given to MPIExecutor.serve, which only uses full fidelity.
+        """
+        pending = [solution for solution in dict.fromkeys(solutions) if self.cached_cost(solution, fidelity) is None]
+        pending.sort(key=lambda solution: (solution.olevel, solution.simd))
+        if executor is None and self._measure_pool is not None:
+            costs = self.collect([self.submit(solution, fidelity=fidelity) for solution in pending])
+        else:
+            executor = executor or self.executor
+            for variant in dict.fromkeys((solution.olevel, solution.simd) for solution in pending):
+                if self.binaries is not None:
+                    self.binaries.get(*variant)
+            results = executor.map(partial(self.evaluate, fidelity=fidelity), pending)
+            if executor.isolated:
+                self.evaluation_session.run_increase(len(pending))
+            costs = [self.accept(solution, result) for solution, result in zip(pending, results)]
+        for solution, cost in zip(pending, costs):
+            self.set_cost(solution, cost, fidelity)
+        return [self.cached_cost(solution, fidelity) for solution in solutions]
+
+    def set_cost(self, solution, cost, fidelity=1):
+        if fidelity == 1:
+            solution.calculated_cost = cost
+        else:
+            self.fidelity_costs[(solution, fidelity)] = cost
+
+    def enable_pipeline(self, max_pending_builds=2):
+        """
+        Makes submit() asynchronous: measurements run one at a time in a background thread while the binaries of
+        upcoming solutions are compiled by a single build thread. At most max_pending_builds builds are queued,
+        so compilation only uses spare cores and never piles up behind the measurements.
+        """
+        self._measure_pool = ThreadPoolExecutor(max_workers=1)
+        self._build_pool = ThreadPoolExecutor(max_workers=1)
+        self._build_slots = threading.Semaphore(max_pending_builds)
+        self._prefetching = set()
+
+    def submit(self, solution, **kwargs):
+        """Schedules the evaluation of a solution and returns a future with its cost"""
+        if self._measure_pool is None:
+            future = Future()
+            future.set_result(self.cost(solution, **kwargs))
+            return future
+        self.prefetch([solution])
+        return self._measure_pool.submit(self.cost, solution, **kwargs)
+
+    def collect(self, futures):
+        return [future.result() for future in futures]
+
+    def prefetch(self, solutions):
+        """Starts compiling, in the background, the binaries needed by solutions that will be evaluated soon"""
+        if self._build_pool is None or self.binaries is None:
+            return
+        for solution in solutions:
+            variant = (solution.olevel, solution.simd)
+            if variant in self._prefetching or self.binaries.is_built(*variant):
+                continue
+            if not self._build_slots.acquire(blocking=False):
+                return  # queue is full, the measurement thread will build it on demand
+            self._prefetching.add(variant)
+            future = self._build_pool.submit(self.binaries.get, *variant)
+            future.add_done_callback(lambda _, variant=variant: self._prefetch_done(variant))
+
+    def _prefetch_done(self, variant):
+        # build errors are not raised here: the measurement will build again and report them
+        self._prefetching.discard(variant)
+        self._build_slots.release()
+
+    def lookup_samples(self, solution, with_energy=False, fidelity=1):
+        """Returns previously recorded (throughput, energy) samples for the solution, or None"""
+        if self.results_db is None:
+            return None
+        with timers.phase('cache'):
+            return self.results_db.lookup(self.program_path, self.source_hash,
+                                          self.get_database_key(solution, fidelity), with_energy)
+
+    def get_database_key(self, solution, fidelity=1):
+        """
+        Compilation flags, followed by the program arguments for reduced fidelities and for full runs of another
+        number of iterations than the default (costs depend on it)
+        """
+        if fidelity == 1 and self.iterations == DEFAULT_ITERATIONS:
+            return solution.get_compilation_flags()
+        return solution.get_compilation_flags() + ' @ ' + ' '.join(self.program_arguments(solution, fidelity))
+
+    def program_arguments(self, solution, fidelity=1):
+        """
+        Command line of a run. A fidelity below 1 is the fraction of the work of a full run to do, taken from the
+        number of iterations, from the grid (every dimension scaled alike, in multiples of 16) or from both.
+        """
+        iterations = self.iterations
+        sizes = [solution.problem_size_x, solution.problem_size_y, solution.problem_size_z]
+        if fidelity != 1:
+            grid_fraction = {'iterations': 1, 'grid': fidelity, 'both': fidelity ** 0.5}[self.fidelity_on]
+            iterations = max(1, round(iterations * fidelity / grid_fraction))
+            sizes = [max(16, int(size * grid_fraction ** (1 / 3)) // 16 * 16) for size in sizes]
+        return [str(sizes[0]), str(sizes[1]), str(sizes[2]),
+                str(solution.nthreads), str(iterations),
+                str(min(solution.thrdblock_x, sizes[0])),
+                str(solution.thrdblock_y),
+                str(solution.thrdblock_z)]
+
+    def run_program(self, executable_path, solution, environment, verbose=False, fidelity=1):
+        """Runs the program once with the solution parameters and returns the throughput it reports"""
+        with timers.phase('execute'):
+            result = subprocess.run([executable_path] + self.program_arguments(solution, fidelity),
+                                    capture_output=True,
+                                    env=environment)
+        if result.returncode != 0:
+            raise Exception(f'Failed executing: {result.returncode}')
+
+        output = result.stdout
+        with timers.phase('parse'):
+            m = re.search('throughput:\s+([\d\.]+)', str(output))
+        throughput = m.group(1)
+        if verbose:
+            print(output)
+        try:
+            return float(throughput)
+        except:
+            raise ValueError('throughput not a float')
+
+    def log_evaluation(self, solution, cost, throughputs, energies=None, build_time=None, run_times=None,
+                       fidelity=1):
+        """Records a measurement, with its raw samples and timings, in the event log"""
+        self.evaluation_session.logger.write_event(
+            'eval', eval=self.get_counter(), cost=cost, samples=throughputs, energies=energies,
+            build_time=build_time, run_times=run_times, fidelity=fidelity, iterations=self.iterations,
+            **solution.get_fields()
+        )
+
+    def record_samples(self, solution, throughputs, energies=None, fidelity=1):
+        if self.results_db is None:
+            return
+        self.results_db.add_samples(self.program_path, self.source_hash, self.get_database_key(solution, fidelity),
+                                    throughputs, energies)
+
 
 class NaiveEvaluator(BaseEvaluator):
-    def __init__(self, program_path, evaluation_session):
-        super().__init__(program_path, evaluation_session)
+    def __init__(self, program_path, evaluation_session, results_db=None, iterations=DEFAULT_ITERATIONS,
+                 fidelity_on='iterations'):
+        super().__init__(program_path, evaluation_session, results_db, iterations, fidelity_on)
 
-    def cost(self, solution, verbose=False, delete_file=True, num_evaluations=1, ignore_cache=False, affinity='balanced'):
-        program_path = self.program_path
-        if not ignore_cache and solution.calculated_cost is not None:
-            return solution.calculated_cost
-        self.evaluation_session.run_increase(num_evaluations)  # Increases in num_evaluations the counter of runs
+    def cost_from_samples(self, samples):
+        return round(np.mean([throughput for throughput, _ in samples]), 2)
 
-        file_name = str(threading.get_ident())
-        file_name_with_ext = f'{file_name}.exe'
-        executable_path = f'{program_path}/bin/{file_name_with_ext}'
+    def cost(self, solution, verbose=False, num_evaluations=1, ignore_cache=False, affinity='balanced', fidelity=1):
+        if not ignore_cache and self.cached_cost(solution, fidelity) is not None:
+            return self.cached_cost(solution, fidelity)
+        self.evaluation_session.run_increase(num_evaluations)  # Increases in num_evaluations the counter of runs
 
-        result = subprocess.run(
-            ['make', '-C', program_path, f'Olevel={solution.olevel}', f'simd={solution.simd}', 'last'],
-            stdout=subprocess.DEVNULL,
-            env=dict(os.environ, CONFIG_EXE_NAME=file_name_with_ext))
-        if result.returncode != 0:
-            raise Exception(f'Failed compiling: {result.returncode}')
+        start_time = time.perf_counter()
+        executable_path = self.binaries.get(solution.olevel, solution.simd)
+        build_time = time.perf_counter() - start_time
 
-        mean_throughput = 0
+        throughputs = []
+        run_times = []
         new_environment = dict(os.environ, KMP_AFFINITY=affinity)
         for _ in range(num_evaluations):
-            result = subprocess.run([executable_path,
-                                     str(solution.problem_size_x),
-                                     str(solution.problem_size_y),
-                                     str(solution.problem_size_z),
-                                     str(solution.nthreads), '100',
-                                     str(solution.thrdblock_x),
-                                     str(solution.thrdblock_y),
-                                     str(solution.thrdblock_z)],
-                                    capture_output=True,
-                                    env=new_environment)
-            if result.returncode != 0:
-                raise Exception(f'Failed executing: {result.returncode}')
+            start_time = time.perf_counter()
+            throughputs.append(self.run_program(executable_path, solution, new_environment, verbose, fidelity))
+            run_times.append(time.perf_counter() - start_time)
 
-            output = result.stdout
-            m = re.search('throughput:\s+([\d\.]+)', str(output))
-            throughput = m.group(1)
-            try:
-                mean_throughput += float(throughput)
-            except:
-                raise ValueError('throughput not a float')
-            if verbose:
-                print(output)
-
-        if delete_file:
-            result = subprocess.run(['rm', executable_path])
-            if result.returncode != 0:
-                raise Exception(f'Failed deleting: {result.returncode}')
-
-        mean_throughput = round(mean_throughput / num_evaluations, 2)
-
-        solution.calculated_cost = mean_throughput
+        self.record_samples(solution, throughputs, fidelity=fidelity)
+        mean_throughput = round(sum(throughputs) / num_evaluations, 2)
+        self.log_evaluation(solution, mean_throughput, throughputs, build_time=build_time, run_times=run_times,
+                            fidelity=fidelity)
+
+        self.set_cost(solution, mean_throughput, fidelity)
         return mean_throughput
 
-#To use this class you must be root
+#To use this class you must be root (or be allowed to read the RAPL counters)
 class EnergyEvaluator(BaseEvaluator): 
-    def __init__(self, program_path, evaluation_session):
-        super().__init__(program_path, evaluation_session)
-
-    def csv_to_energy(self,csv_path='temporary_csv_file.csv'):
-        """takes a csv file from cpu_monitor and return the energy consumed"""
-        idx = pd.Index([],dtype='int64')
-        df = pd.read_csv(csv_path,sep=';')
-        df = df.iloc[1: , :]
-
-        sub_df = df.filter(regex=("^PW_*"))
-        (max_row, max_col) = sub_df.shape
-        for i in range(0, max_col):
-            idx = idx.union(sub_df[sub_df.iloc[:,i]>8000.0].index)
-        df.drop(idx, inplace=True)
-            
-        (max_row, max_col) = df.shape
-        df[df.select_dtypes(include=[np.number]).ge(0).all(1)]
-
-        power_pkg_table   = df.filter(regex=("^PW_PKG[0-9]*"))
-        power_dram_table  = df.filter(regex=("^PW_DRAM[0-9]*"))
-
-        power_row, power_col = power_pkg_table.shape
-        pkg = power_col
-
-        t   = df['TIME'].to_numpy()
-        t_min = np.min(t)
-        t_max = np.max(t)
-
-        dram_energy = 0.0 
-        pkg_energy = 0.0 
-        for i in range(0, power_col):
-            dram_energy += np.trapz(power_dram_table.iloc[:,i].to_numpy(),t)/1000.0
-            pkg_energy += np.trapz(power_pkg_table.iloc[:,i].to_numpy(),t)/1000.0
-
-        return dram_energy,pkg_energy,dram_energy+pkg_energy
-    
-    def energy_throughput_compute(self, solution, verbose=False, delete_file=True, num_evaluations=1, ignore_cache=False, affinity='balanced'):
-        program_path = self.program_path
-        if not ignore_cache and solution.calculated_cost is not None:
-            return solution.calculated_cost
+    uses_energy = True
+
+    def __init__(self, program_path, evaluation_session, results_db=None, iterations=DEFAULT_ITERATIONS,
+                 rapl_root='/sys/class/powercap', energy_weight=None):
+        super().__init__(program_path, evaluation_session, results_db, iterations)
+        self.rapl_root = rapl_root
+        self.energy_weight = energy_weight
+        self.warned_no_energy = False
+        self.pareto = ParetoArchive()
+        RaplMeter(rapl_root)  # fails early if the counters are not available
+
+    def scalarize(self, throughput, energy):
+        """
+        Throughput per joule by default. With an energy weight w, throughput^(1-w) / energy^w instead:
+        0 only optimizes the throughput, 1 only the energy, values in between pick other points of the front.
+        Without measured energy (counters that did not advance during a short run), only the throughput is used.
+        """
+        if energy <= 0:
+            if not self.warned_no_energy:
+                self.warned_no_energy = True
+                self.evaluation_session.logger.write_info(
+                    f'No energy measured in {self.rapl_root}, costs of such runs are the throughput alone'
+                )
+            return throughput
+        if self.energy_weight is None:
+            return throughput / energy
+        return throughput ** (1 - self.energy_weight) / energy ** self.energy_weight
+
+    def evaluate(self, solution, fidelity=1):
+        """Only the objectives: the receiving rank scalarizes them with its own weight"""
+        self.cost(solution, fidelity=fidelity)
+        return None, self.objectives.get(solution)
+
+    def accept(self, solution, result):
+        _, objectives = result
+        self.add_objectives(solution, objectives)
+        return self.scalarize(*objectives)
+
+    def objectives_from_samples(self, samples):
+        mean_throughput = round(np.mean([throughput for throughput, _ in samples]), 2)
+        mean_energy = round(np.mean([energy for _, energy in samples]), 2)
+        return mean_throughput, mean_energy
+
+    def cost_from_samples(self, samples):
+        return self.scalarize(*self.objectives_from_samples(samples))
+
+    def energy_throughput_compute(self, solution, verbose=False, num_evaluations=1, ignore_cache=False, affinity='balanced'):
+        if not ignore_cache:
+            samples = self.lookup_samples(solution, with_energy=self.uses_energy)
+            if samples is not None:
+                objectives = self.objectives_from_samples(samples)
+                self.add_objectives(solution, objectives)
+                return objectives
         self.evaluation_session.run_increase(num_evaluations)  # Increases in num_evaluations the counter of runs
 
-        file_name = str(threading.get_ident())
-        file_name_with_ext = f'{file_name}.exe'
-        executable_path = f'{program_path}/bin/{file_name_with_ext}'
+        start_time = time.perf_counter()
+        executable_path = self.binaries.get(solution.olevel, solution.simd)
+        build_time = time.perf_counter() - start_time
 
-        result = subprocess.run(['make', '-C', program_path, f'Olevel={solution.olevel}', f'simd={solution.simd}', 'last'],
-                                stdout=subprocess.DEVNULL,
-                                env=dict(os.environ, CONFIG_EXE_NAME=file_name_with_ext))
-        if result.returncode != 0:
-            raise Exception(f'Failed compiling: { result.returncode }')
-
-        mean_throughput = 0
-        mean_energy = 0
+        throughputs = []
+        energies = []
+        run_times = []
         new_environment = dict(os.environ, KMP_AFFINITY=affinity)
-        csv_path = 'temporary_csv_file.csv'
+        meter = RaplMeter(self.rapl_root)  # one meter per call, evaluations may run in several threads
         for _ in range(num_evaluations):
-            result_nrj = subprocess.run(['cpu_monitor_binary/releases/default/cpu_monitor.x','--csv',f'--csv-file={csv_path}','--quiet','--redirect',executable_path,
-                                     str(solution.problem_size_x),
-                                     str(solution.problem_size_y),
-                                     str(solution.problem_size_z),
-                                     str(solution.nthreads), '100',
-                                     str(solution.thrdblock_x),
-                                     str(solution.thrdblock_y),
-                                     str(solution.thrdblock_z)],
-                                     capture_output=True,
-                                     env=new_environment)
-            energy = self.csv_to_energy('temporary_csv_file.csv')[2]
-            
-            if result.returncode != 0:
-                raise Exception(f'Failed executing: { result.returncode }')
-
-            with open('temporary_csv_file.out') as  f:
-                output =f.readlines()
-                f.close()
-            m = re.search('throughput:\s+([\d\.]+)', str(output))
-            throughput = m.group(1)
-            try:
-                mean_throughput += float(throughput)
-                mean_energy += float(energy)
-            except:
-                raise ValueError('throughput not a float')
-            if verbose:
-                print(output)
-
-        if delete_file:
-            result = subprocess.run(['rm', executable_path])
-            if result.returncode != 0:
-                raise Exception(f'Failed deleting: { result.returncode }')
-
-        mean_throughput = round(mean_throughput/num_evaluations, 2)
-        mean_energy = round(mean_energy/num_evaluations, 2)
-        solution.calculated_cost = mean_throughput / mean_energy
+            start_time = time.perf_counter()
+            meter.start()
+            throughput = self.run_program(executable_path, solution, new_environment, verbose)
+            energy = meter.stop()  # joules of every package and dram domain
+            run_times.append(time.perf_counter() - start_time)
+            throughputs.append(throughput)
+            energies.append(sum(energy.values()))
+
+        self.record_samples(solution, throughputs, energies)
+        mean_throughput = round(sum(throughputs)/num_evaluations, 2)
+        mean_energy = round(sum(energies)/num_evaluations, 2)
+        self.add_objectives(solution, (mean_throughput, mean_energy))
+        self.log_evaluation(solution, self.scalarize(mean_throughput, mean_energy), throughputs, energies,
+                            build_time, run_times)
         return mean_throughput,mean_energy
 
-    def cost(self, solution, verbose=False, delete_file=True, num_evaluations=1, ignore_cache=False, affinity='balanced'):
-        throughput,energy = self.energy_throughput_compute(solution, verbose, delete_file, num_evaluations, ignore_cache, affinity)
-        return throughput/energy
+    def cost(self, solution, verbose=False, num_evaluations=1, ignore_cache=False, affinity='balanced', fidelity=1):
+        if fidelity != 1:
+            raise Exception('Reduced fidelities are not supported when measuring energy')
+        if not ignore_cache and self.cached_cost(solution) is not None:
+            return solution.calculated_cost
+        throughput,energy = self.energy_throughput_compute(solution, verbose, num_evaluations, ignore_cache, affinity)
+        solution.calculated_cost = self.scalarize(throughput, energy)
+        return solution.calculated_cost
+
+
+class ReplayEvaluator(BaseEvaluator):
+    """
+    Answers from previously recorded measurements instead of running the program, to develop and tune algorithms
+    without the machine. The sources are results databases (SQLite) and event logs (JSON Lines, see
+    Logger.write_event). Every evaluation draws its samples from the ones recorded for the configuration,
+    so the noise of the real measurements is reproduced (and follows --seed).
+    Configurations that were never measured are handled by `policy`:
+        'nearest': inverse-distance interpolation of the nearest recorded configurations (SurrogateModel)
+                   plus Gaussian noise as large as the average noise of the recordings; at a reduced fidelity
+                   without recordings, the full-fidelity ones are used, and `default_cost` if there are none
+        'constant': always `default_cost`
+        'error': raises an exception
+    """
+    def __init__(self, sources, evaluation_session, program_path=None, policy='nearest', default_cost=0,
+                 iterations=DEFAULT_ITERATIONS, fidelity_on='iterations'):
+        super().__init__(None, evaluation_session, None, iterations, fidelity_on)
+        self.policy = policy
+        self.default_cost = default_cost
+        self.samples = {}  # database key -> recorded throughputs
+        for source in sources:
+            if source.endswith('.jsonl'):
+                self.load_events(source)
+            else:
+                self.load_database(source, program_path)
+        if len(self.samples) == 0:
+            raise Exception(f'No measurement found in {" ".join(sources)} for runs of {iterations} iterations')
+        self.models = {}  # fidelity -> SurrogateModel, for the nearest policy
+        deviations = [np.std(samples) for samples in self.samples.values() if len(samples) > 1]
+        self.noise = np.mean(deviations) if len(deviations) > 0 else 0
+
+    def load_database(self, path, program_path=None):
+        for key, samples in ResultsDatabase(path).get_all_samples(program_path).items():
+            self.samples.setdefault(key, []).extend(throughput for throughput, _ in samples)
+
+    def load_events(self, paths):
+        from optimizer.logger import read_events
+        events = read_events(paths, event='eval')
+        fidelities = events['fidelity'] if 'fidelity' in events else [1] * len(events)
+        iterations = events['iterations'] if 'iterations' in events else [DEFAULT_ITERATIONS] * len(events)
+        for fields, samples, fidelity, recorded_iterations in zip(events[list(Solution.FIELDS)].itertuples(index=False),
+                                                                  events['samples'], fidelities, iterations):
+            if recorded_iterations != self.iterations:
+                continue  # runs of another length
+            key = self.get_database_key(Solution(*fields), fidelity)
+            self.samples.setdefault(key, []).extend(samples)
+
+    def get_model(self, fidelity):
+        """Nearest-neighbours model of the mean recorded cost, trained on the configurations of this fidelity"""
+        if fidelity not in self.models:
+            model = SurrogateModel(min_samples=1)
+            for key, samples in self.samples.items():
+                # keys of other fidelities or run lengths differ in the program arguments
+                solution = Solution(*key.split(' @ ')[0].split())
+                if key == self.get_database_key(solution, fidelity):
+                    model.observe(solution, np.mean(samples))
+            self.models[fidelity] = model
+        return self.models[fidelity]
+
+    def replay(self, solution, num_evaluations, fidelity):
+        recorded = self.samples.get(self.get_database_key(solution, fidelity))
+        if recorded is not None:
+            return [float(np.random.choice(recorded)) for _ in range(num_evaluations)]
+        if self.policy == 'constant':
+            return [float(self.default_cost)] * num_evaluations
+        if self.policy == 'nearest' and self.get_model(fidelity).is_ready():
+            predicted = self.get_model(fidelity).predict([solution])[0]
+            return [float(predicted + np.random.normal(0, self.noise)) for _ in range(num_evaluations)]
+        if self.policy == 'nearest' and fidelity != 1:
+            return self.replay(solution, num_evaluations, 1)
+        if self.policy == 'nearest':
+            return [float(self.default_cost)] * num_evaluations
+        raise Exception(f'No recorded measurement for {solution.get_compilation_flags()} at fidelity {fidelity}')
+
+    def cost_from_samples(self, samples):
+        return round(np.mean([throughput for throughput, _ in samples]), 2)
+
+    def cost(self, solution, verbose=False, num_evaluations=1, ignore_cache=False, affinity='balanced', fidelity=1):
+        if not ignore_cache and self.cached_cost(solution, fidelity) is not None:
+            return self.cached_cost(solution, fidelity)
+        self.evaluation_session.run_increase(num_evaluations)
+        throughputs = self.replay(solution, num_evaluations, fidelity)
+        mean_throughput = round(sum(throughputs) / num_evaluations, 2)
+        self.log_evaluation(solution, mean_throughput, throughputs, fidelity=fidelity)
+        self.set_cost(solution, mean_throughput, fidelity)
+        return mean_throughput
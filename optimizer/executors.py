@@ -0,0 +1,154 @@
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from mpi4py import MPI
+
+from optimizer.timing import timers
+
+
+class SerialExecutor:
+    isolated = False  # True when the side effects of the function (caches, counters) are lost
+
+    def map(self, function, items):
+        return [function(item) for item in items]
+
+
+class ThreadExecutor:
+    isolated = False
+
+    def __init__(self, workers=None) -> None:
+        self.workers = workers
+
+    def map(self, function, items):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(function, items))
+
+
+_worker_function = None
+
+def _call_worker_function(item):
+    return _worker_function(item)
+
+class ProcessExecutor:
+    """
+    Runs the function in forked processes, so it does not need to be picklable (only items and results are).
+    Do not use it in MPI runs if the MPI implementation does not support fork.
+    """
+    isolated = True
+
+    def __init__(self, workers=None) -> None:
+        self.workers = workers
+
+    def map(self, function, items):
+        global _worker_function
+        _worker_function = function  # inherited by the forked workers
+        with multiprocessing.get_context('fork').Pool(self.workers) as pool:
+            return pool.map(_call_worker_function, items)
+
+
+class MPIExecutor:
+    """
+    Dynamic master/worker executor. The root hands out a single item to each idle worker and sends the next one
+    as soon as a result comes back, so slow and fast evaluations balance out instead of waiting for the slowest
+    rank. The root also evaluates items itself in a background thread (only its main thread makes MPI calls).
+    Every other rank sits in serve() evaluating with its own function until stop() is called.
+    """
+    isolated = False
+    TASK_TAG = 1
+    RESULT_TAG = 2
+    STOP_TAG = 3
+
+    def __init__(self, comm, root=0, evaluate_on_root=True, poll_interval=0.01) -> None:
+        self.comm = comm
+        self.root = root
+        self.poll_interval = poll_interval
+        self._queue = deque()
+        self._idle_workers = [rank for rank in range(comm.Get_size()) if rank != root]
+        self._busy_workers = 0
+        if comm.Get_size() == 1:
+            evaluate_on_root = True
+        self._local_pool = ThreadPoolExecutor(max_workers=1) if evaluate_on_root else None
+        self._local_task = None  # (tag, future) evaluated by the root
+
+    def map(self, function, items):
+        for i, item in enumerate(items):
+            self.submit(i, item)
+        results = [None] * len(items)
+        while self.pending() > 0:
+            for i, result in self.wait(function):
+                results[i] = result
+        return results
+
+    def submit(self, tag, item):
+        """Queues an item, its result will be returned by wait() together with the tag"""
+        self._queue.append((tag, item))
+
+    def pending(self):
+        return len(self._queue) + self._busy_workers + (self._local_task is not None)
+
+    def wait(self, function):
+        """Dispatches queued items and blocks until at least one result is available, returns [(tag, result)]"""
+        if self.pending() == 0:
+            return []
+        self._dispatch(function)
+        completed = []
+        status = MPI.Status()
+        while not completed:
+            if self._local_task is not None and self._local_task[1].done():
+                tag, future = self._local_task
+                self._local_task = None
+                completed.append((tag, future.result()))
+            if self._busy_workers > 0:
+                if self._local_task is None and not completed:
+                    with timers.phase('mpi_wait'):
+                        self.comm.Probe(source=MPI.ANY_SOURCE, tag=self.RESULT_TAG, status=status)
+                while self.comm.Iprobe(source=MPI.ANY_SOURCE, tag=self.RESULT_TAG, status=status):
+                    completed.append(self.comm.recv(source=status.Get_source(), tag=self.RESULT_TAG))
+                    self._idle_workers.append(status.Get_source())
+                    self._busy_workers -= 1
+            if not completed:
+                with timers.phase('mpi_wait'):
+                    time.sleep(self.poll_interval)
+            self._dispatch(function)
+        return completed
+
+    def _dispatch(self, function):
+        while self._queue and self._idle_workers:
+            self.comm.send(self._queue.popleft(), dest=self._idle_workers.pop(), tag=self.TASK_TAG)
+            self._busy_workers += 1
+        if self._queue and self._local_pool is not None and self._local_task is None:
+            tag, item = self._queue.popleft()
+            self._local_task = (tag, self._local_pool.submit(function, item))
+
+    def serve(self, function):
+        status = MPI.Status()
+        while True:
+            with timers.phase('mpi_wait'):
+                message = self.comm.recv(source=self.root, tag=MPI.ANY_TAG, status=status)
+            if status.Get_tag() == self.STOP_TAG:
+                return
+            tag, item = message
+            self.comm.send((tag, function(item)), dest=self.root, tag=self.RESULT_TAG)
+
+    def stop(self):
+        for rank in range(self.comm.Get_size()):
+            if rank != self.root:
+                self.comm.send(None, dest=rank, tag=self.STOP_TAG)
+        if self._local_pool is not None:
+            self._local_pool.shutdown()
+
+
+EXECUTORS = {
+    'serial': SerialExecutor,
+    'thread': ThreadExecutor,
+    'process': ProcessExecutor,
+}
+
+def get_executor(executor_name, workers=None):
+    if executor_name == 'serial':
+        return SerialExecutor()
+    if EXECUTORS.get(executor_name) is None:
+        raise NotImplementedError
+    return EXECUTORS[executor_name](workers)
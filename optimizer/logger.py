@@ -2,50 +2,178 @@ import os, sys
 import time
 import re
 import shutil, glob
+import json
+import queue
+import atexit
+import threading
+import weakref
+
+from mpi4py import MPI
+
+from optimizer.solution import Solution
+from optimizer.timing import timers
+
+class MPIFileSink():
+    """
+    Log file shared by all the ranks of a communicator. Ranks append through the MPI-IO shared file pointer, so the
+    file holds the lines of every rank in the order they were written. Lines not tagged with their rank yet
+    (raw lines, blank lines) get a [Me=rank] prefix. Opening and closing are collective.
+    """
+    def __init__(self, comm, path):
+        self.file = MPI.File.Open(comm, path, MPI.MODE_WRONLY | MPI.MODE_CREATE)
+        self.file.Set_size(0)
+        self.tag = f'[Me={comm.Get_rank()}]'
+
+    def write(self, text):
+        lines = [line if self.tag in line else f'{self.tag} {line}' for line in text.splitlines(keepends=True)]
+        self.file.Write_shared(''.join(lines).encode())
+
+    def flush(self):
+        pass  # Write_shared does not return before the data is handed to MPI-IO
+
+    def close(self):
+        self.file.Close()
+
+_loggers = weakref.WeakSet()  # loggers of this process, flushed at exit and reset in forked children
+atexit.register(lambda: [logger.flush() for logger in list(_loggers)])
+os.register_at_fork(after_in_child=lambda: [logger._after_fork() for logger in list(_loggers)])
 
 class Logger():
-    def __init__(self, process_id, logfile='lastrun.log', save_to_logfile=True, save_to_terminal=True):
+    """
+    Writes to the terminal, the log file and the event file from a background thread, so that logging does not
+    slow down the evaluations: callers only queue the raw values of a message (a bounded queue, they wait when it
+    is full), which the thread formats, serializes and writes in batches. With a communicator of more than one
+    rank, the log file is shared by all the ranks (see MPIFileSink) and every rank must call close().
+    """
+    def __init__(self, process_id, logfile='lastrun.log', save_to_logfile=True, save_to_terminal=True,
+                 events_file=None, comm=None, asynchronous=True, queue_size=10000):
         self.Me = process_id
 
-        self.log = open(logfile, "w") if save_to_logfile else None
+        self.log = None
+        if save_to_logfile and comm is not None and comm.Get_size() > 1:
+            self.log = MPIFileSink(comm, logfile)
+        elif save_to_logfile:
+            self.log = open(logfile, "w")
         self.terminal = sys.stdout if save_to_terminal else None
-    
-    def write_msg(self, iteration_number, evaluation_number, cost, compilation_flags, flair=None):
+        # structured copy of the messages and evaluations, one JSON object per line (see read_events)
+        self.events = open(events_file, "w") if events_file else None
+        self.lock = threading.Lock()  # evaluations may be logged from executor threads
+
+        self.queue = None
+        if isinstance(self.log, MPIFileSink) and MPI.Query_thread() != MPI.THREAD_MULTIPLE:
+            asynchronous = False  # MPI-IO calls must stay in the threads that use MPI
+        if asynchronous:
+            self.queue = queue.Queue(queue_size)
+            self.writer = threading.Thread(target=self._write_batches, daemon=True)
+            self.writer.start()
+        _loggers.add(self)
+
+    def _after_fork(self):
+        """Forked children (ProcessExecutor workers) have no writer thread: they write synchronously"""
+        self.queue = None
+        self.lock = threading.Lock()
+        if isinstance(self.log, MPIFileSink):
+            self.log = None  # MPI cannot be used from a forked child, its lines only go to the terminal
+
+    def _write(self, kind, *values):
+        """Queues a message: ('text', text), ('msg', time, k, eval, cost, solution, flair) or ('event', name, time, fields)"""
+        with timers.phase('logging'):
+            if self.queue is not None:
+                self.queue.put((kind,) + values)
+            else:
+                with self.lock:
+                    self._write_batch([(kind,) + values])
+
+    def _format(self, item):
+        """Log text and event record (or None) of a queued message"""
+        kind = item[0]
+        if kind == 'text':
+            return item[1], None
+        if kind == 'event':
+            _, event, event_time, fields = item
+            return '', self._format_event(event, event_time, fields)
         # Example:
         # [15:12:58] [Me=0] [k=1] Cost=151.31 -O3 avx512 12 12 12 (New best!)
-        current_time = time.strftime("%H:%M:%S", time.localtime())
-        
-        logstring = (f"[{current_time}]"
+        _, msg_time, iteration_number, evaluation_number, cost, solution, flair = item
+        logstring = (f"[{time.strftime('%H:%M:%S', time.localtime(msg_time))}]"
         f"\t[Me={self.Me}]"
         f"\t[k={iteration_number}]"
         f"\t[eval={evaluation_number}]"
         f"\tCost={cost}"
-        f"\t{compilation_flags}")
+        f"\t{solution.get_compilation_flags()}")
         if flair:
             logstring += f"\t({flair})"
+        record = None
+        if self.events:
+            record = self._format_event('step', msg_time, dict(k=iteration_number, eval=evaluation_number, cost=cost,
+                                                               flair=flair, **solution.get_fields()))
+        return logstring + "\n", record
+
+    def _format_event(self, event, event_time, fields):
+        # numpy scalars are converted here, an exception would stop the writer thread
+        return json.dumps({'event': event, 'time': event_time, 'Me': self.Me, **fields},
+                          default=lambda value: value.item() if hasattr(value, 'item') else str(value)) + "\n"
+
+    def _write_batch(self, batch):
+        formatted = [self._format(item) for item in batch]
+        lines = "".join(text for text, _ in formatted)
+        records = "".join(record for _, record in formatted if record is not None)
+        if lines and self.terminal:
+            self.terminal.write(lines)
+            self.terminal.flush()
+        if lines and self.log:
+            self.log.write(lines)
+            self.log.flush()
+        if records and self.events:
+            self.events.write(records)
+            self.events.flush()
+
+    def _write_batches(self, max_batch=1000):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch([item for item in batch if item is not None])
+            for _ in batch:
+                self.queue.task_done()
+            if None in batch:
+                return
+
+    def flush(self):
+        """Waits until every queued message has been written"""
+        if self.queue is not None:
+            self.queue.join()
+
+    def close(self):
+        if self.queue is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.queue = None
+        if self.log: self.log.close()
+        if self.events: self.events.close()
+        self.log = self.events = None
 
-        if self.terminal: self.terminal.write(logstring + "\n")
-        if self.log: self.log.write(logstring + "\n")
-        if self.log: self.log.flush()
+    def write_event(self, event, **fields):
+        if not self.events:
+            return
+        self._write('event', event, time.time(), fields)
+    
+    def write_msg(self, iteration_number, evaluation_number, cost, solution, flair=None):
+        """Logs a step of a search: the line of the log file and, with an events file, a 'step' event"""
+        self._write('msg', time.time(), iteration_number, evaluation_number, cost, solution, flair)
 
     def write_info(self, infostring):
-        if self.terminal: self.terminal.write(f"[info] [Me={self.Me}] " + infostring + "\n")
-        if self.log: self.log.write(f"[info] [Me={self.Me}] " + infostring + "\n")
-        if self.log: self.log.flush()
+        self._write('text', f"[info] [Me={self.Me}] " + infostring + "\n")
 
     def jumpline(self):
-        if self.terminal: self.terminal.write("\n")
-        if self.log: self.log.write("\n")
-        if self.log: self.log.flush()
+        self._write('text', "\n")
 
     def write_raw(self, textstring):
         # Safe to use with strings starting with '\t'
-        if self.terminal: self.terminal.write(textstring + "\n")
-        if self.log: self.log.write(textstring + "\n")
-        if self.log: self.log.flush()
-
-    def __del__(self):
-        if self.log: self.log.close()
+        self._write('text', textstring + "\n")
 
 def find_slurmfile(directory):
     candidates = glob.glob(directory + '/slurm-*.out')
@@ -74,6 +202,7 @@ def log_to_list(logfile):
     data = []
     with open(logfile, 'r') as f:
         for line in f:
+            line = re.sub(r'^\[Me=\d+\] ', '', line)  # rank tag of untagged lines in shared logs (MPIFileSink)
             if line.startswith('[info]') or line.startswith('\t'):
                 continue
             else:
@@ -85,7 +214,7 @@ def log_to_list(logfile):
                         ord(']'): None,
                     })
                     # time regex
-                    m = re.search("/(?:[01]\d|2[0-3]):(?:[0-5]\d):(?:[0-5]\d)/", txt)
+                    m = re.search("(?:[01]\d|2[0-3]):(?:[0-5]\d):(?:[0-5]\d)", txt)
                     if m is not None:
                         line_dict['time'] = m.group(0)
                     else:
@@ -100,8 +229,46 @@ def log_to_list(logfile):
                             m = re.search("\((.+)\)", txt)
                             if m is not None:
                                 line_dict['flair'] = m.group(1)
-                    # TODO: compilation flags
+                            elif len(txt.split()) == len(Solution.FIELDS):
+                                # compilation flags
+                                line_dict.update(zip(Solution.FIELDS, txt.split()))
                 if line_dict:
                     # if line_dict is not empty
                     data.append(line_dict)
-    return data
\ No newline at end of file
+    return data
+
+def read_events(paths, event='step'):
+    """
+    Loads JSON Lines event files (a path, a glob or a list of them) into a pandas DataFrame with one column per
+    field, keeping the records of the given type (all of them if event is None). The files are parsed in a single
+    pass and a 'file' column tells which run each record comes from.
+    Example:
+        steps = read_events('runs/*.events.jsonl')
+        steps.groupby('file')['cost'].max()
+        evaluations = read_events('runs/*.events.jsonl', event='eval')
+    """
+    import io
+    import numpy as np
+    import pandas as pd  # only needed for the analysis
+
+    if isinstance(paths, str):
+        paths = [paths]
+    files = [file for path in paths for file in sorted(glob.glob(path))]
+    texts, counts = [], []
+    for file in files:
+        with open(file) as f:
+            text = f.read()
+        text = text[:text.rfind('\n') + 1]  # drops a record cut off by an interrupted run
+        texts.append(text)
+        counts.append(text.count('\n'))
+    if sum(counts) == 0:
+        return pd.DataFrame()
+    data = pd.read_json(io.StringIO(''.join(texts)), lines=True)
+    data['file'] = np.repeat(files, counts)
+    if event is not None:
+        data = data[data['event'] == event].dropna(axis=1, how='all').reset_index(drop=True)
+        for column in ('k', 'eval'):
+            # counters only become floats because other records do not have them
+            if column in data and data[column].notna().all():
+                data[column] = data[column].astype('int64')
+    return data
@@ -11,7 +11,13 @@ import numpy as np
 from optimizer import evaluators
 from optimizer.algorithms import get_algorithm, ALGORITHMS
 from optimizer.deployment import deploy_kangaroo, deploy_single
-from optimizer.logger import Logger, find_slurmfile, slurm_to_logfile
+from optimizer.executors import EXECUTORS, get_executor
+from optimizer.logger import Logger
+from optimizer.pareto import ParetoArchive
+from optimizer.racing import race
+from optimizer.results_db import ResultsDatabase
+from optimizer.solution_space import SolutionSpace
+from optimizer.timing import timers, summarize, format_summary, save_reports
 
 from mpi4py import MPI
 
@@ -23,13 +29,61 @@ def make_deterministic(seed):
     np.random.seed(real_seed)
     logger.write_info(f'real seed: {real_seed}')
 
+def prebuild_binaries(args, comm, evaluator):
+    '''Compiles every variant before the search and prunes the simd values that fail to build or run'''
+    variants = [(olevel, simd) for olevel in SolutionSpace.o_levels for simd in SolutionSpace.simds]
+    logger.write_info(f'Prebuilding {len(variants)} binaries')
+    failed = evaluator.binaries.prebuild(variants, args.build_workers, comm if args.batch else None)
+    for olevel, simd in failed:
+        logger.write_info(f'Failed building or running {olevel} {simd}')
+        if simd in SolutionSpace.simds:
+            # ISA flags are what usually breaks a variant, so the whole simd value is pruned
+            SolutionSpace.simds.remove(simd)
+    if len(SolutionSpace.simds) == 0:
+        raise Exception('No simd value could be built')
+    logger.write_info(f'Available simds: {" ".join(SolutionSpace.simds)}')
+
+def get_energy_weight(args, comm, algorithm):
+    if args.energy_weight is None:
+        return None
+    if len(set(args.energy_weight)) > 1 and algorithm.uses_shared_evaluations():
+        raise Exception(f'{args.algorithm} compares the costs of all ranks, it takes a single --energy_weight')
+    energy_weight = args.energy_weight[comm.Get_rank() % len(args.energy_weight)]
+    logger.write_info(f'Energy weight: {energy_weight}')
+    return energy_weight
+
+def report_pareto_front(comm, evaluator):
+    '''Merges the Pareto archives of all ranks and logs the front, from the fastest to the most frugal'''
+    archives = comm.gather(list(evaluator.pareto), root=0)
+    if comm.Get_rank() != 0:
+        return
+    front = ParetoArchive()
+    for archive in archives:
+        front.merge(archive)
+    logger.write_info(f'Pareto front ({len(front)} solutions, throughput energy):')
+    for (throughput, energy), solution in front:
+        logger.write_raw('\t' + str(throughput) + ' ' + str(-energy) + ' ' + solution.get_compilation_flags())
+        logger.write_event('pareto', throughput=throughput, energy=-energy, **solution.get_fields())
+
+def report_timings(args, comm):
+    '''Gathers the phase timers of all ranks, logs the summary and optionally saves everything as JSON'''
+    reports = timers.gather(comm)
+    if comm.Get_rank() != 0:
+        return
+    logger.write_info('Time per phase (summed over ranks):')
+    for line in format_summary(summarize(reports)):
+        logger.write_raw('\t' + line)
+    if args.timings_json is not None:
+        save_reports(args.timings_json, reports)
+
 def run_algorithm(algorithm, args, comm, evaluator):
     Me = comm.Get_rank()
-    best_solution, best_cost, path = algorithm.run(args.steps, evaluator)
-    TabE = comm.gather(best_cost,root=0)
-    TabS = comm.gather(best_solution,root=0)
     start_time = time.time()
-    total_runs = comm.reduce(evaluator.get_counter(),op=MPI.SUM, root=0)
+    best_solution, best_cost, path = algorithm.run(args.steps, evaluator)
+    with timers.phase('mpi_wait'):
+        TabE = comm.allgather(best_cost)
+        TabS = comm.allgather(best_solution)
+        total_runs = comm.reduce(evaluator.get_counter(),op=MPI.SUM, root=0)
     if best_cost is not None:
         logger.write_info('Path taken:')
         for sol in path:
@@ -38,32 +92,49 @@ def run_algorithm(algorithm, args, comm, evaluator):
         logger.write_info('Best solution found:')
         logger.write_raw('\t' + str(best_cost) + ' ' + best_solution.get_compilation_flags())
 
-        if (Me == 0):
-            comm.Barrier() # guarantee that these will be the final messages
-            TabE = [x for x in TabE if x is not None]
-            TabS = [x for x in TabS if x is not None]
-            logger.jumpline()
-            logger.write_info('Gathering solutions from all processes')
-            logger.write_info('Best solutions:')
+    # every rank re-measures a share of the gathered solutions
+    found = [(E, S) for E, S in zip(TabE, TabS) if E is not None and S is not None]
+    TabE = [E for E, _ in found]
+    TabS = [S for _, S in found]
+    if isinstance(evaluator, evaluators.EnergyEvaluator) and args.energy_weight is not None:
+        # the solutions of ranks with different weights are compared with a single one
+        evaluator.energy_weight = args.energy_weight[0]
+        if Me == 0:
+            logger.write_info(f'Final evaluation with energy weight {evaluator.energy_weight}')
+    best_ix, samples = race(
+        TabS,
+        lambda solution: evaluator.cost(solution, ignore_cache=True),
+        confidence=args.race_confidence,
+        min_samples=args.race_min_samples,
+        max_samples=args.race_max_samples,
+        comm=comm,
+    )
+    with timers.phase('mpi_wait'):
+        comm.Barrier() # guarantee that these will be the final messages
 
-            best_ix = 0
-            best_E_overall = -1
+    if (Me == 0):
+        logger.jumpline()
+        logger.write_info('Gathering solutions from all processes')
+        if best_ix is None:
+            logger.write_info('No solution was found by any process')
+        else:
+            logger.write_info('Best solutions:')
             for i in range(len(TabE)):
-                recalculated_cost = evaluator.cost(TabS[i], num_evaluations=3, ignore_cache=True)
-                logger.write_raw('\t' + str(TabE[i]) + ' ' + TabS[i].get_compilation_flags() + ' Final evaluation: ' + str(recalculated_cost))
-                if recalculated_cost > best_E_overall:
-                    best_E_overall = recalculated_cost
-                    best_ix = i
+                recalculated_cost = round(np.mean(samples[i]), 2)
+                logger.write_raw('\t' + str(TabE[i]) + ' ' + TabS[i].get_compilation_flags() + ' Final evaluation: ' + str(recalculated_cost) + f' ({len(samples[i])} samples)')
+                logger.write_event('final', found_cost=TabE[i], cost=recalculated_cost, samples=samples[i],
+                                   **TabS[i].get_fields())
+            best_E_overall = round(np.mean(samples[best_ix]), 2)
 
             logger.write_info('Best overall:')
             logger.write_raw('\t' + str(best_E_overall) + ' ' + TabS[best_ix].get_compilation_flags())
-            logger.write_info(f'Total cost evaluations: {total_runs}')
-            final_time = time.time()
-            elapsed_time = np.round(final_time - start_time, 2)
-            logger.write_info(f'Elapsed time: {elapsed_time} seconds')
-            return
-    if (Me != 0):
-        comm.Barrier()
+        logger.write_info(f'Total cost evaluations: {total_runs}')
+        final_time = time.time()
+        elapsed_time = np.round(final_time - start_time, 2)
+        logger.write_info(f'Elapsed time: {elapsed_time} seconds')
+    if evaluator.pareto is not None:
+        report_pareto_front(comm, evaluator)
+    report_timings(args, comm)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Optimizer Launcher')
@@ -78,9 +149,53 @@ if __name__ == "__main__":
     parser.add_argument('--problem_size', type=int, nargs=3, default=[256, 256, 256], help='Three dimensions of problem size')
     parser.add_argument('--flexible_shape', action='store_true', help='Allows changing the problem shape')
     parser.add_argument('--use_energy', action='store_true', help='Use energy consumption in the cost function')
+    parser.add_argument('--iterations', type=int, default=evaluators.DEFAULT_ITERATIONS, help='Time steps of a full-fidelity run of the program')
+    parser.add_argument('--fidelity_on', type=str, choices=['iterations', 'grid', 'both'], default='iterations',
+                        help='What reduced-fidelity runs (successive_halving) scale down')
+    parser.add_argument('--energy_weight', type=float, nargs='+', default=None,
+                        help='With --use_energy, maximizes throughput^(1-w) / energy^w instead of throughput per joule '
+                             '(0: throughput only, 1: energy only); with several values, rank r uses the r-th one '
+                             '(only for algorithms whose ranks search independently)')
+    parser.add_argument('--rapl_root', type=str, default='/sys/class/powercap',
+                        help='Powercap sysfs directory read to measure the energy with --use_energy')
     parser.add_argument('--phase', type=str, default='deploy', choices=['deploy', 'run'])
     parser.add_argument('--program_path', type=str, default='iso3dfd-st7', help='Folder that contains program code')
     parser.add_argument('--log', type=str, default='myLog.log', help='Name of the log file (with extension)')
+    parser.add_argument('--events', type=str, default=None,
+                        help='JSON Lines event log (default: next to --log, one file per rank with --batch)')
+    parser.add_argument('--prebuild', action='store_true',
+                        help='Compiles all binaries before the search and prunes the ones that fail')
+    parser.add_argument('--build_workers', type=int, default=None, help='Number of concurrent builds when prebuilding')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Compiles upcoming solutions while the current one is being measured')
+    parser.add_argument('--pipeline_depth', type=int, default=2, help='Maximum number of queued background builds')
+    parser.add_argument('--executor', type=str, choices=EXECUTORS.keys(), default='serial',
+                        help='How batches of solutions are evaluated inside each process')
+    parser.add_argument('--workers', type=int, default=None, help='Number of workers of the thread/process executor')
+    parser.add_argument('--race_confidence', type=float, default=0.95,
+                        help='Confidence level used to eliminate candidates in the final evaluation')
+    parser.add_argument('--race_min_samples', type=int, default=3,
+                        help='Measurements of every candidate before eliminations start in the final evaluation')
+    parser.add_argument('--race_max_samples', type=int, default=10,
+                        help='Maximum measurements of a candidate in the final evaluation')
+    parser.add_argument('--timings_json', type=str, default=None,
+                        help='Saves the time spent per phase and per rank to this JSON file')
+    parser.add_argument('--checkpoint', type=str, default='checkpoint',
+                        help='Prefix of the per-rank checkpoint files ({prefix}.rank{rank}.pkl)')
+    parser.add_argument('--checkpoint_interval', type=int, default=0,
+                        help='Iterations between checkpoints (default 0: no checkpoints)')
+    parser.add_argument('--resume', action='store_true', help='Continues from the checkpoint of a previous run')
+    parser.add_argument('--replay', type=str, nargs='+', default=None,
+                        help='Replays measurements recorded in results databases or event logs (*.jsonl) '
+                             'instead of running the program')
+    parser.add_argument('--replay_policy', type=str, choices=['nearest', 'constant', 'error'], default='nearest',
+                        help='Cost of configurations never measured: interpolated, --replay_default, or an error')
+    parser.add_argument('--replay_default', type=float, default=0, help='Cost used by --replay_policy constant (and nearest, when nothing can be interpolated)')
+    parser.add_argument('--results_db', type=str, default=None, help='SQLite file storing measurements across runs')
+    parser.add_argument('--db_max_age', type=float, default=None,
+                        help='Seconds after which a stored measurement is no longer reused')
+    parser.add_argument('--db_min_samples', type=int, default=1,
+                        help='Stored samples needed to reuse a measurement instead of running the program')
 
     args = parser.parse_args()
     hparams = json.loads(args.hparams)
@@ -88,10 +203,17 @@ if __name__ == "__main__":
     comm = MPI.COMM_WORLD
 
     logfile = args.log
+    events_file = args.events
+    if events_file is None and args.phase == 'run':
+        events_file = os.path.splitext(logfile)[0] + '.events.jsonl'
+    if events_file is not None and args.batch:
+        events_file = events_file.replace('.jsonl', '') + f'.rank{comm.Get_rank()}.jsonl'
     if args.batch:
-        logger = Logger(process_id=comm.Get_rank(), save_to_logfile=False)
+        # a single log file written by every rank (the deploy phase only submits the job)
+        logger = Logger(process_id=comm.Get_rank(), logfile=logfile, save_to_logfile=args.phase == 'run',
+                        events_file=events_file, comm=comm)
     else:
-        logger = Logger(process_id=comm.Get_rank(), logfile=logfile)
+        logger = Logger(process_id=comm.Get_rank(), logfile=logfile, events_file=events_file)
 
     logger.write_info('Args:')
     for k, v in sorted(vars(args).items()):
@@ -99,6 +221,7 @@ if __name__ == "__main__":
 
     algorithm_class = get_algorithm(args.algorithm)
     algorithm = algorithm_class(hparams, args.problem_size, comm, logger, args.flexible_shape)
+    algorithm.configure_checkpoint(args.checkpoint, args.checkpoint_interval, args.resume)
 
     logger.write_info('Hyperparameters:')
     for k, v in sorted(algorithm.hparams.items()):
@@ -113,12 +236,24 @@ if __name__ == "__main__":
         deploy_single(args, sys.argv[0], logger)
     else: # phase is run
         evaluation_session = evaluators.Simulator(logger)
-        evaluator = evaluators.NaiveEvaluator(args.program_path, evaluation_session)
-        if args.use_energy:
-            evaluator = evaluators.EnergyEvaluator(args.program_path, evaluation_session)
+        results_db = None
+        if args.results_db is not None:
+            results_db = ResultsDatabase(args.results_db, args.db_max_age, args.db_min_samples)
+        if args.replay is not None:
+            evaluator = evaluators.ReplayEvaluator(args.replay, evaluation_session, args.program_path,
+                                                   args.replay_policy, args.replay_default, args.iterations,
+                                                   args.fidelity_on)
+        elif args.use_energy:
+            evaluator = evaluators.EnergyEvaluator(args.program_path, evaluation_session, results_db, args.iterations,
+                                                   args.rapl_root, get_energy_weight(args, comm, algorithm))
+        else:
+            evaluator = evaluators.NaiveEvaluator(args.program_path, evaluation_session, results_db, args.iterations,
+                                                  args.fidelity_on)
+        evaluator.executor = get_executor(args.executor, args.workers)
+        if args.pipeline:
+            evaluator.enable_pipeline(args.pipeline_depth)
+        if args.prebuild and args.replay is None:
+            prebuild_binaries(args, comm, evaluator)
         run_algorithm(algorithm, args, comm, evaluator)
         logger.write_info(f"Run finished. Logs can be found at {logfile}.")
-    
-    # retrieve logs from slurm file
-    if args.batch:
-        slurm_to_logfile(find_slurmfile(os.getcwd()), logfile)
\ No newline at end of file
+    logger.close()
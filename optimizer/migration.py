@@ -0,0 +1,98 @@
+import random
+import time
+
+from mpi4py import MPI
+
+from optimizer.timing import timers
+
+TOPOLOGIES = ['ring', 'bidirectional', 'all', 'random']
+POLICIES = ['better', 'always']
+
+
+class Island:
+    """
+    Island model: every rank runs its own search and, every `interval` steps, sends its best (solution, cost) to
+    its neighbours in the topology. Nothing ever blocks during the search: sends are non-blocking and arrivals are
+    picked up by polling a standing receive, so a slow rank never holds up the others.
+    The sends are synchronous (issend) so that finish() can tell when all of them were received: every rank keeps
+    draining its receives until a non-blocking barrier, entered once its own sends are complete, completes on all
+    ranks. No message is left behind in MPI, whatever the order in which the ranks end their searches.
+    """
+    TAG = 11
+
+    def __init__(self, comm, interval, topology='ring', policy='better', poll_interval=0.01) -> None:
+        if topology not in TOPOLOGIES:
+            raise Exception(f'Unknown migration topology {topology}, expected one of {TOPOLOGIES}')
+        if policy not in POLICIES:
+            raise Exception(f'Unknown migration policy {policy}, expected one of {POLICIES}')
+        self.comm = comm
+        self.interval = interval
+        self.topology = topology
+        self.policy = policy
+        self.poll_interval = poll_interval
+        self.rank = comm.Get_rank()
+        self.size = comm.Get_size()
+        self.sent = 0
+        self.received = 0
+        self._sends = []
+        self._receive = comm.irecv(source=MPI.ANY_SOURCE, tag=self.TAG)
+
+    def get_targets(self):
+        others = [rank for rank in range(self.size) if rank != self.rank]
+        if self.topology == 'ring':
+            return [(self.rank + 1) % self.size]
+        if self.topology == 'bidirectional':
+            return sorted({(self.rank - 1) % self.size, (self.rank + 1) % self.size})
+        if self.topology == 'all':
+            return others
+        return [random.choice(others)]
+
+    def send(self, k, solution, cost):
+        """Sends the solution to the neighbours when step k is a migration step"""
+        if self.interval <= 0 or k % self.interval != 0:
+            return
+        for target in self.get_targets():
+            self._sends.append(self.comm.issend((self.rank, solution, cost), dest=target, tag=self.TAG))
+            self.sent += 1
+        self._sends = [request for request in self._sends if not request.Test()]
+
+    def receive(self):
+        """Every (rank, solution, cost) arrived since the last call, without waiting"""
+        arrivals = []
+        while True:
+            arrived, message = self._receive.test()
+            if not arrived:
+                return arrivals
+            arrivals.append(message)
+            self.received += 1
+            self._receive = self.comm.irecv(source=MPI.ANY_SOURCE, tag=self.TAG)
+
+    def select(self, arrivals, cost):
+        """The arrival replacing a current solution of cost `cost` according to the policy, if any"""
+        if len(arrivals) == 0:
+            return None
+        best = max(arrivals, key=lambda arrival: arrival[2])
+        if self.policy == 'always' or best[2] > cost:
+            return best
+        return None
+
+    def exchange(self, k, solution, cost):
+        """Sends at migration steps and returns the (rank, solution, cost) that should replace the current one"""
+        self.send(k, solution, cost)
+        return self.select(self.receive(), cost)
+
+    def finish(self):
+        """Collective (non-blocking until every rank calls it): completes the sends, discards late arrivals"""
+        with timers.phase('mpi_wait'):
+            barrier = None
+            while True:
+                self.receive()
+                if barrier is None:
+                    self._sends = [request for request in self._sends if not request.Test()]
+                    if len(self._sends) == 0:
+                        barrier = self.comm.Ibarrier()
+                elif barrier.Test():
+                    break
+                time.sleep(self.poll_interval)
+            self._receive.Cancel()
+            self._receive.Wait()
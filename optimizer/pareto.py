@@ -0,0 +1,71 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+
+def dominates(a, b):
+    """True when objectives a are at least as good as b everywhere and better somewhere (maximization)"""
+    return all(x >= y for x, y in zip(a, b)) and any(x > y for x, y in zip(a, b))
+
+
+class ParetoArchive:
+    """
+    Non-dominated set of solutions for two objectives to maximize. The front is kept sorted by decreasing first
+    objective (so the second one increases along it): inserting a point is a binary search plus the removal of
+    the contiguous run of points it dominates, the history is never re-sorted.
+    """
+    def __init__(self) -> None:
+        self.keys = []  # minus the first objective, increasing
+        self.front = []  # (objectives, solution)
+
+    def add(self, solution, objectives):
+        """Inserts the point unless it is dominated (or already present), returns whether it was inserted"""
+        first, second = objectives
+        end = bisect_right(self.keys, -first)  # points whose first objective is >= first
+        if end > 0 and self.front[end - 1][0][1] >= second:
+            return False
+        start = bisect_left(self.keys, -first)
+        stop = start
+        while stop < len(self.front) and self.front[stop][0][1] <= second:
+            stop += 1
+        self.keys[start:stop] = [-first]
+        self.front[start:stop] = [(tuple(objectives), solution)]
+        return True
+
+    def merge(self, points):
+        for objectives, solution in points:
+            self.add(solution, objectives)
+
+    def __len__(self):
+        return len(self.front)
+
+    def __iter__(self):
+        return iter(self.front)
+
+
+def dominance_fitness(points):
+    """
+    Scalar fitness of a population for rankers that minimize (CMA-ES): the index of the non-dominated front of
+    each point, ties within a front being broken by crowding distance (isolated points first).
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    levels = np.zeros(n, dtype=int)
+    remaining = set(range(n))
+    level = 0
+    while remaining:
+        current = [i for i in remaining if not any(dominates(points[j], points[i]) for j in remaining)]
+        levels[current] = level
+        remaining.difference_update(current)
+        level += 1
+
+    crowding = np.zeros(n)
+    for level in range(levels.max() + 1):
+        members = np.flatnonzero(levels == level)
+        for objective in points.T:
+            order = members[np.argsort(objective[members])]
+            span = objective[order[-1]] - objective[order[0]]
+            crowding[order[0]] = crowding[order[-1]] = np.inf
+            if len(order) > 2 and span > 0:
+                crowding[order[1:-1]] += (objective[order[2:]] - objective[order[:-2]]) / span
+    return levels + 0.5 / (1 + crowding)
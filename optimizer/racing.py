@@ -0,0 +1,60 @@
+import math
+from statistics import NormalDist, mean, stdev
+
+from optimizer import wire
+
+
+def t_quantile(p, degrees_of_freedom):
+    """
+    Student's t quantile: closed forms for 1 and 2 degrees of freedom, otherwise from the normal one
+    (Cornish-Fisher expansion, within ~1% for 3 degrees of freedom)
+    """
+    if degrees_of_freedom == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if degrees_of_freedom == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    v = degrees_of_freedom
+    return (z
+            + (z**3 + z) / (4 * v)
+            + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * v**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * v**3))
+
+
+def confidence_interval(samples, confidence):
+    n = len(samples)
+    half_width = t_quantile((1 + confidence) / 2, n - 1) * stdev(samples) / math.sqrt(n)
+    return mean(samples) - half_width, mean(samples) + half_width
+
+
+def race(candidates, sample, confidence=0.95, min_samples=3, max_samples=10, comm=None):
+    """
+    Successive elimination of candidates (higher is better). Each round, every candidate still in contention
+    is measured once more with sample(candidate); after min_samples rounds, a candidate is dropped when the upper
+    bound of its confidence interval falls below the best lower bound. Stops when a single candidate remains or
+    after max_samples rounds. Returns the index of the best candidate and the samples taken for each one, or
+    (None, None) without candidates.
+    With a communicator, all ranks must call it with the same candidates: the measurements of each round are
+    shared out between the ranks and exchanged, so every rank takes the same decisions.
+    """
+    if len(candidates) == 0:
+        return None, None
+    samples = [[] for _ in candidates]
+    alive = list(range(len(candidates)))
+
+    def measure(share):
+        return [sample(candidates[i]) for i in share]
+
+    for round_number in range(1, max_samples + 1):
+        new_samples = measure(alive) if comm is None else wire.share_out(comm, alive, measure)
+        for i, value in zip(alive, new_samples):
+            samples[i].append(value)
+        if round_number < max(min_samples, 2):
+            continue
+        bounds = {i: confidence_interval(samples[i], confidence) for i in alive}
+        best_lower_bound = max(lower for lower, _ in bounds.values())
+        alive = [i for i in alive if bounds[i][1] >= best_lower_bound]
+        if len(alive) == 1:
+            break
+    best_ix = max(alive, key=lambda i: mean(samples[i]))
+    return best_ix, samples
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+
+def hash_program_source(program_path):
+    """Hash every source file of the program (build outputs in bin/ are ignored)"""
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(program_path):
+        dirs[:] = sorted(d for d in dirs if d != 'bin' and not d.startswith('.'))
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, program_path).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ResultsDatabase:
+    """
+    Persistent store of raw measurements, shared by all runs (and all ranks) that point to the same file.
+    Every sample is kept with its timestamp, keyed by program path, source hash and compilation flags.
+    A stored configuration is reused when it has at least `min_samples` samples younger than `max_age` seconds.
+    """
+    def __init__(self, path, max_age=None, min_samples=1) -> None:
+        self.path = path
+        self.max_age = max_age
+        self.min_samples = min_samples
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS samples ('
+                'program TEXT NOT NULL, '
+                'source_hash TEXT NOT NULL, '
+                'flags TEXT NOT NULL, '
+                'throughput REAL NOT NULL, '
+                'energy REAL, '
+                'timestamp REAL NOT NULL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS samples_key ON samples (program, source_hash, flags, timestamp)'
+            )
+
+    def _connect(self):
+        # a new connection per operation keeps the store safe to use from threads and forked processes
+        return sqlite3.connect(self.path, timeout=60)
+
+    def add_samples(self, program, source_hash, flags, throughputs, energies=None):
+        if energies is None:
+            energies = [None] * len(throughputs)
+        now = time.time()
+        rows = [(program, source_hash, flags, t, e, now) for t, e in zip(throughputs, energies)]
+        with closing(self._connect()) as connection, connection:
+            connection.executemany('INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def get_samples(self, program, source_hash, flags, with_energy=False):
+        """Returns the fresh samples of a configuration as a list of (throughput, energy) tuples"""
+        query = 'SELECT throughput, energy FROM samples WHERE program = ? AND source_hash = ? AND flags = ?'
+        parameters = [program, source_hash, flags]
+        if self.max_age is not None:
+            query += ' AND timestamp >= ?'
+            parameters.append(time.time() - self.max_age)
+        if with_energy:
+            query += ' AND energy IS NOT NULL'
+        with closing(self._connect()) as connection:
+            return connection.execute(query, parameters).fetchall()
+
+    def get_all_samples(self, program=None):
+        """Every stored sample (of any source version), as {flags: [(throughput, energy), ...]}"""
+        query = 'SELECT flags, throughput, energy FROM samples'
+        parameters = []
+        if program is not None:
+            query += ' WHERE program = ?'
+            parameters.append(program)
+        samples = {}
+        with closing(self._connect()) as connection:
+            for flags, throughput, energy in connection.execute(query, parameters):
+                samples.setdefault(flags, []).append((throughput, energy))
+        return samples
+
+    def lookup(self, program, source_hash, flags, with_energy=False):
+        """Returns the stored samples if they satisfy the freshness/sample-count policy, otherwise None"""
+        samples = self.get_samples(program, source_hash, flags, with_energy)
+        if len(samples) < self.min_samples:
+            return None
+        return samples
@@ -1,58 +1,109 @@
 import numpy as np
 
 from optimizer.solution_space import SolutionSpace
+from optimizer.timing import timers
 
 
 class Solution:
-    def __init__(self, olevel, simd, problem_size_x, problem_size_y, problem_size_z, nthreads, thrdblock_x, thrdblock_y,
-                 thrdblock_z) -> None:
-        self.olevel = olevel
-        self.simd = simd
-        self.problem_size_x = problem_size_x
-        self.problem_size_y = problem_size_y
-        self.problem_size_z = problem_size_z
-        self.nthreads = nthreads
-        self.thrdblock_x = thrdblock_x
-        self.thrdblock_y = thrdblock_y
-        self.thrdblock_z = thrdblock_z
-        self.calculated_cost = None
+    """
+    Immutable configuration of the program. Solutions are interned: building the same configuration twice returns
+    the same object, so equal solutions share one cached cost and can be used as dictionary/set keys.
+    """
+    FIELDS = ('olevel', 'simd', 'problem_size_x', 'problem_size_y', 'problem_size_z', 'nthreads', 'thrdblock_x',
+              'thrdblock_y', 'thrdblock_z')
+    __slots__ = FIELDS + ('calculated_cost', '_key')
+    _interned = {}
+
+    def __new__(cls, olevel, simd, problem_size_x, problem_size_y, problem_size_z, nthreads, thrdblock_x, thrdblock_y,
+                thrdblock_z):
+        key = (str(olevel), str(simd), int(problem_size_x), int(problem_size_y), int(problem_size_z), int(nthreads),
+               int(thrdblock_x), int(thrdblock_y), int(thrdblock_z))
+        solution = cls._interned.get(key)
+        if solution is None:
+            solution = object.__new__(cls)
+            for field, value in zip(cls.FIELDS, key):
+                object.__setattr__(solution, field, value)
+            object.__setattr__(solution, '_key', key)
+            object.__setattr__(solution, 'calculated_cost', None)
+            cls._interned[key] = solution
+        return solution
+
+    def __setattr__(self, name, value):
+        if name != 'calculated_cost':
+            raise AttributeError(f'Solution is immutable, use get_modified_copy to change {name}')
+        object.__setattr__(self, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, Solution) and self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __reduce__(self):
+        # keeps interning (and the cached cost) when solutions are sent between processes
+        return _unpickle_solution, (self._key, self.calculated_cost)
+
+    def __repr__(self):
+        return f'Solution({self.get_compilation_flags()})'
+
+    def get_key(self):
+        return self._key
+
+    @classmethod
+    def get_known_costs(cls):
+        return {key: solution.calculated_cost for key, solution in cls._interned.items()
+                if solution.calculated_cost is not None}
+
+    @classmethod
+    def set_known_costs(cls, known_costs):
+        for key, calculated_cost in known_costs.items():
+            cls(*key).calculated_cost = calculated_cost
+
+    def get_indices(self):
+        """Integer encoding: indices into SolutionSpace (thrdblock_x always follows problem_size_x)"""
+        return (SolutionSpace.o_levels.index(self.olevel),
+                SolutionSpace.simds.index(self.simd),
+                SolutionSpace.problem_size.index(self.problem_size_x),
+                SolutionSpace.problem_size.index(self.problem_size_y),
+                SolutionSpace.problem_size.index(self.problem_size_z),
+                SolutionSpace.nthreads.index(self.nthreads),
+                SolutionSpace.threadblocks.index(self.thrdblock_y),
+                SolutionSpace.threadblocks.index(self.thrdblock_z))
+
+    @classmethod
+    def from_indices(cls, indices):
+        olevel, simd, problem_size_x, problem_size_y, problem_size_z, nthreads, thrdblock_y, thrdblock_z = indices
+        return cls(SolutionSpace.o_levels[olevel],
+                   SolutionSpace.simds[simd],
+                   SolutionSpace.problem_size[problem_size_x],
+                   SolutionSpace.problem_size[problem_size_y],
+                   SolutionSpace.problem_size[problem_size_z],
+                   SolutionSpace.nthreads[nthreads],
+                   SolutionSpace.problem_size[problem_size_x],
+                   SolutionSpace.threadblocks[thrdblock_y],
+                   SolutionSpace.threadblocks[thrdblock_z])
 
     def get_modified_copy(self, olevel=None, simd=None, problem_size_x=None, problem_size_y=None, problem_size_z=None,
                           nthreads=None, thrdblock_x=None, thrdblock_y=None, thrdblock_z=None):
-        new_sol = Solution(self.olevel, self.simd, self.problem_size_x, self.problem_size_y, self.problem_size_z,
-                           self.nthreads, self.thrdblock_x, self.thrdblock_y, self.thrdblock_z)
-        if olevel is not None:
-            new_sol.olevel = olevel
-        if simd is not None:
-            new_sol.simd = simd
-        if problem_size_x is not None:
-            new_sol.problem_size_x = problem_size_x
-        if problem_size_y is not None:
-            new_sol.problem_size_y = problem_size_y
-        if problem_size_z is not None:
-            new_sol.problem_size_z = problem_size_z
-        if nthreads is not None:
-            new_sol.nthreads = nthreads
-        if thrdblock_x is not None:
-            new_sol.thrdblock_x = thrdblock_x
-        if thrdblock_y is not None:
-            new_sol.thrdblock_y = thrdblock_y
-        if thrdblock_z is not None:
-            new_sol.thrdblock_z = thrdblock_z
-        return new_sol
+        changes = (olevel, simd, problem_size_x, problem_size_y, problem_size_z, nthreads, thrdblock_x, thrdblock_y,
+                   thrdblock_z)
+        return Solution(*[current if new is None else new for current, new in zip(self._key, changes)])
 
     def get_neighbors(self, optimize_problem_size=True):
+        with timers.phase('neighbors'):
+            return self._get_neighbors(optimize_problem_size)
+
+    def _get_neighbors(self, optimize_problem_size):
         neigh = []
 
-        olevels = set(SolutionSpace.o_levels)
-        olevels.remove(self.olevel)
-        for level in olevels:
-            neigh.append(self.get_modified_copy(olevel=level))
+        # iterate in SolutionSpace order (not over a set) so that seeded runs are reproducible
+        for level in SolutionSpace.o_levels:
+            if level != self.olevel:
+                neigh.append(self.get_modified_copy(olevel=level))
 
-        simds = set(SolutionSpace.simds)
-        simds.remove(self.simd)
-        for simd in simds:
-            neigh.append(self.get_modified_copy(simd=simd))
+        for simd in SolutionSpace.simds:
+            if simd != self.simd:
+                neigh.append(self.get_modified_copy(simd=simd))
 
         n_thread_ix = SolutionSpace.nthreads.index(self.nthreads)
         if n_thread_ix > 0:
@@ -141,9 +192,17 @@ class Solution:
         print(self.olevel, self.simd, self.problem_size_x, self.problem_size_y,
               self.problem_size_z, self.nthreads, self.thrdblock_x, self.thrdblock_y, self.thrdblock_z)
 
+    def get_fields(self):
+        return dict(zip(self.FIELDS, self._key))
+
     def get_compilation_flags(self):
         return " ".join((self.olevel, self.simd, str(self.problem_size_x), str(self.problem_size_y),
                          str(self.problem_size_z), str(self.nthreads), str(self.thrdblock_x), str(self.thrdblock_y),
                          str(self.thrdblock_z)))
 
 
+def _unpickle_solution(key, calculated_cost):
+    solution = Solution(*key)
+    if solution.calculated_cost is None:
+        solution.calculated_cost = calculated_cost
+    return solution
@@ -0,0 +1,79 @@
+import numpy as np
+
+from optimizer.solution_space import SolutionSpace
+
+
+def solution_features(solution):
+    """Encodes a solution as a vector of features of similar scales (roughly in [0, 1])"""
+    return [
+        SolutionSpace.o_levels.index(solution.olevel) / max(len(SolutionSpace.o_levels) - 1, 1),
+        SolutionSpace.simds.index(solution.simd) / max(len(SolutionSpace.simds) - 1, 1),
+        np.log2(solution.problem_size_x) / 11,
+        np.log2(solution.problem_size_y) / 11,
+        np.log2(solution.problem_size_z) / 11,
+        solution.nthreads / max(SolutionSpace.nthreads),
+        solution.thrdblock_y / max(SolutionSpace.threadblocks),
+        solution.thrdblock_z / max(SolutionSpace.threadblocks),
+    ]
+
+
+class SurrogateModel:
+    """
+    Cheap regression of the cost on the solution features (inverse-distance weighted k nearest neighbours),
+    trained on every measurement seen so far. Used to rank neighbors before spending real evaluations on them.
+    Predictions are remembered so that they can be compared with the measured costs.
+    """
+    def __init__(self, n_neighbors=5, min_samples=10) -> None:
+        self.n_neighbors = n_neighbors
+        self.min_samples = min_samples
+        self.features = []
+        self.costs = []
+        self.observed = set()
+        self.predictions = {}
+        self.errors = []  # (predicted, measured) pairs
+
+    def is_ready(self):
+        return len(self.costs) >= self.min_samples
+
+    def observe(self, solution, cost):
+        """Adds a measurement to the training set, returns the cost that had been predicted for it (or None)"""
+        if solution in self.observed:
+            return None
+        self.observed.add(solution)
+        self.features.append(solution_features(solution))
+        self.costs.append(cost)
+        predicted = self.predictions.pop(solution, None)
+        if predicted is not None:
+            self.errors.append((predicted, cost))
+        return predicted
+
+    def predict(self, solutions):
+        features = np.array([solution_features(s) for s in solutions])
+        known_features = np.array(self.features)
+        known_costs = np.array(self.costs)
+        distances = np.linalg.norm(features[:, None, :] - known_features[None, :, :], axis=2)
+        k = min(self.n_neighbors, len(self.costs))
+        nearest = np.argsort(distances, axis=1)[:, :k]
+        weights = 1 / (np.take_along_axis(distances, nearest, axis=1) + 1e-6)
+        return np.sum(weights * known_costs[nearest], axis=1) / np.sum(weights, axis=1)
+
+    def screen(self, solutions, keep):
+        """Returns the `keep` solutions with the highest predicted cost, best first"""
+        if len(solutions) == 0:
+            return solutions
+        predicted = self.predict(solutions)
+        order = np.argsort(-predicted)[:keep]
+        for i in order:
+            self.predictions[solutions[i]] = predicted[i]
+        return [solutions[i] for i in order]
+
+    def report(self):
+        """Mean absolute error and correlation between predicted and measured costs of screened solutions"""
+        if len(self.errors) < 2:
+            return {'samples': len(self.errors), 'mae': None, 'correlation': None}
+        predicted, measured = np.array(self.errors).T
+        return {
+            'samples': len(self.errors),
+            'mae': float(np.mean(np.abs(predicted - measured))),
+            'correlation': float(np.corrcoef(predicted, measured)[0, 1]),
+        }
@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# phases reported in this order, others (if any) after them
+PHASES = ['compile', 'execute', 'parse', 'cache', 'neighbors', 'mpi_wait', 'logging']
+
+
+class PhaseTimers:
+    """
+    Wall-clock time and number of calls accumulated per phase in this process. Phases timed in several threads
+    at once (executors, pipeline, builds) add up, so their total can exceed the elapsed time.
+    """
+    def __init__(self) -> None:
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start_time)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.totals[name] += seconds
+            self.counts[name] += 1
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+            self.counts.clear()
+            self.start_time = time.perf_counter()
+
+    def get_report(self):
+        return {
+            'elapsed': time.perf_counter() - self.start_time,
+            'phases': {name: {'seconds': self.totals[name], 'calls': self.counts[name]} for name in self.totals},
+        }
+
+    def gather(self, comm, root=0):
+        """Collective: returns the reports of all ranks on the root (None elsewhere)"""
+        return comm.gather(self.get_report(), root=root)
+
+
+timers = PhaseTimers()  # shared by the evaluators, the algorithms and the logger
+
+
+def summarize(reports):
+    """Per-phase totals over the ranks, the slowest rank and the share of the summed elapsed time"""
+    elapsed = sum(report['elapsed'] for report in reports)
+    names = [name for name in PHASES if any(name in report['phases'] for report in reports)]
+    names += sorted({name for report in reports for name in report['phases']} - set(names))
+    summary = []
+    for name in names:
+        seconds = [report['phases'].get(name, {}).get('seconds', 0) for report in reports]
+        calls = [report['phases'].get(name, {}).get('calls', 0) for report in reports]
+        summary.append({
+            'phase': name,
+            'calls': sum(calls),
+            'seconds': sum(seconds),
+            'max_rank_seconds': max(seconds),
+            'share': sum(seconds) / elapsed if elapsed > 0 else 0,
+        })
+    return summary
+
+
+def format_summary(summary):
+    lines = [f"{'phase':<12}{'calls':>10}{'total (s)':>12}{'max rank (s)':>14}{'share':>8}"]
+    for row in summary:
+        lines.append(f"{row['phase']:<12}{row['calls']:>10}{row['seconds']:>12.2f}"
+                     f"{row['max_rank_seconds']:>14.2f}{row['share']:>8.1%}")
+    return lines
+
+
+def save_reports(path, reports):
+    with open(path, 'w') as f:
+        json.dump({'ranks': reports, 'summary': summarize(reports)}, f, indent=2)
@@ -0,0 +1,168 @@
+import argparse
+import json
+import random
+
+import nevergrad as ng
+import numpy as np
+
+from optimizer import evaluators
+from optimizer.algorithms import get_algorithm, ALGORITHMS
+from optimizer.logger import Logger
+from optimizer.results_db import ResultsDatabase
+
+from mpi4py import MPI
+
+
+def get_default_space(algorithm, fixed_hparams=None):
+    """
+    Search space around the registered defaults of an algorithm: booleans are chosen, positive integers range from
+    a quarter to four times the default, fractions from half the default to halfway to 1, larger numbers over
+    two orders of magnitude (log scale). Zeros (often 'disabled') and strings are not tuned, nor the fixed
+    hyperparameters, nor those whose enabling hyperparameter is disabled (e.g. surrogate_min_samples while
+    surrogate_keep is 0).
+    """
+    fixed_hparams = fixed_hparams or {}
+    space = {}
+    for name, default in algorithm.default_hparams.items():
+        if name in fixed_hparams:
+            continue
+        if isinstance(default, bool):
+            space[name] = {'choices': [False, True]}
+        elif isinstance(default, int) and default > 0:
+            space[name] = [max(1, default // 4), default * 4, 'int']
+        elif isinstance(default, float) and 0 < default < 1:
+            space[name] = [default / 2, (1 + default) / 2]
+        elif isinstance(default, (int, float)) and default > 0:
+            space[name] = [default / 10, default * 10, 'log']
+    for name, switch in algorithm.hparam_switches.items():
+        if switch not in space and not fixed_hparams.get(switch, algorithm.default_hparams[switch]):
+            space.pop(name, None)
+    return space
+
+
+def get_parametrization(space):
+    """Nevergrad parametrization of a space: {name: [lower, upper(, 'int' or 'log')] or {'choices': [...]}}"""
+    parameters = {}
+    for name, spec in space.items():
+        if isinstance(spec, dict):
+            parameters[name] = ng.p.Choice(spec['choices'])
+            continue
+        lower, upper, kind = (spec + ['float'])[:3]
+        if kind == 'log':
+            parameters[name] = ng.p.Log(lower=lower, upper=upper)
+        else:
+            parameters[name] = ng.p.Scalar(lower=lower, upper=upper)
+        if kind == 'int':
+            parameters[name].set_integer_casting()
+    return ng.p.Instrumentation(**parameters)
+
+
+def run_trial(hparams, args, evaluator, logger):
+    """
+    Runs an independent search (on this rank only) per seed and returns the best costs. The seeds are the same for
+    every trial, so trials are compared on the same random starts.
+    """
+    costs = []
+    start_counter = evaluator.get_counter()
+    for seed in range(args.seed, args.seed + args.seeds):
+        random.seed(seed)
+        np.random.seed(seed)
+        algorithm = get_algorithm(args.algorithm)(hparams, args.problem_size, MPI.COMM_SELF, logger,
+                                                  args.flexible_shape)
+        _, best_cost, _ = algorithm.run(args.steps, evaluator)
+        costs.append(best_cost)
+    loss = -np.mean(costs) if None not in costs else np.inf
+    return {'hparams': hparams, 'costs': costs, 'loss': float(loss),
+            'evaluations': evaluator.get_counter() - start_counter}
+
+
+def get_evaluator(args, logger):
+    evaluation_session = evaluators.Simulator(logger)
+    if args.replay is not None:
+        return evaluators.ReplayEvaluator(args.replay, evaluation_session, args.program_path, args.replay_policy)
+    results_db = ResultsDatabase(args.results_db) if args.results_db is not None else None
+    return evaluators.NaiveEvaluator(args.program_path, evaluation_session, results_db)
+
+
+def to_json(value):
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Hyperparameter tuning of the search algorithms')
+    parser.add_argument('--algorithm', type=str, choices=ALGORITHMS.keys(), default='simulated_annealing')
+    parser.add_argument('--steps', type=int, default=20, help='Number of steps of every search')
+    parser.add_argument('--budget', type=int, default=20, help='Number of hyperparameter sets tried')
+    parser.add_argument('--seeds', type=int, default=3, help='Searches (with different seeds) per hyperparameter set')
+    parser.add_argument('--seed', type=int, default=42, help='First seed of the searches')
+    parser.add_argument('--optimizer', type=str, default='NGOpt', help='Nevergrad optimizer (e.g. NGOpt, BO)')
+    parser.add_argument('--space', type=str, default=None,
+                        help='JSON search space, e.g. \'{"t0": [1, 1000, "log"], "lambda": [0.8, 1]}\' '
+                             '(default: around the registered defaults of the algorithm)')
+    parser.add_argument('--hparams', type=str, default='{}', help='JSON hyperparameters fixed during the tuning')
+    parser.add_argument('--problem_size', type=int, nargs=3, default=[256, 256, 256],
+                        help='Three dimensions of problem size')
+    parser.add_argument('--flexible_shape', action='store_true', help='Allows changing the problem shape')
+    parser.add_argument('--program_path', type=str, default='iso3dfd-st7', help='Folder that contains program code')
+    parser.add_argument('--results_db', type=str, default=None,
+                        help='SQLite file sharing the measurements between ranks, trials and tuning runs')
+    parser.add_argument('--replay', type=str, nargs='+', default=None,
+                        help='Replays recorded measurements instead of running the program (see optimizer.main)')
+    parser.add_argument('--replay_policy', type=str, choices=['nearest', 'constant', 'error'], default='nearest')
+    parser.add_argument('--log', type=str, default='tune.log', help='Name of the log file (with extension)')
+    parser.add_argument('--output', type=str, default='tune.json', help='JSON file receiving every trial')
+
+    args = parser.parse_args()
+    fixed_hparams = json.loads(args.hparams)
+
+    comm = MPI.COMM_WORLD
+    Me = comm.Get_rank()
+    logger = Logger(process_id=Me, logfile=args.log, save_to_logfile=Me == 0, save_to_terminal=Me == 0)
+    search_logger = Logger(process_id=Me, save_to_logfile=False, save_to_terminal=False)
+    # one evaluator per rank for all the trials: measurements are cached across trials (and in the database)
+    evaluator = get_evaluator(args, search_logger)
+
+    # the space is built and checked on every rank, so that an error stops all of them before the first collective
+    if args.space is not None:
+        space = json.loads(args.space)
+    else:
+        algorithm = get_algorithm(args.algorithm)({}, args.problem_size, MPI.COMM_SELF, search_logger,
+                                                  args.flexible_shape)
+        space = get_default_space(algorithm, fixed_hparams)
+    if len(space) == 0:
+        raise Exception(f'The search space of {args.algorithm} is empty (by default, zeros, strings and fixed '
+                        f'hyperparameters are not tuned), give one with --space')
+    if args.optimizer not in ng.optimizers.registry:
+        raise Exception(f'Unknown nevergrad optimizer {args.optimizer}')
+    parametrization = get_parametrization(space)
+    if Me == 0:
+        logger.write_info(f'Search space: {json.dumps(space)}')
+        # every rank runs one trial at a time, so the optimizer is asked for a batch of world size candidates
+        optimizer = ng.optimizers.registry[args.optimizer](
+            parametrization=parametrization, budget=args.budget, num_workers=comm.Get_size()
+        )
+    trials = []
+    while len(trials) < args.budget:
+        batch_size = min(comm.Get_size(), args.budget - len(trials))
+        candidates = []
+        if Me == 0:
+            candidates = [optimizer.ask() for _ in range(batch_size)]
+        hparams = [dict(fixed_hparams, **candidate.kwargs) for candidate in candidates]
+        my_hparams = comm.scatter(hparams + [None] * (comm.Get_size() - batch_size) if Me == 0 else None, root=0)
+        result = run_trial(my_hparams, args, evaluator, search_logger) if my_hparams is not None else None
+        results = comm.gather(result, root=0)
+        if Me == 0:
+            for candidate, result in zip(candidates, results):
+                optimizer.tell(candidate, result['loss'])
+                trials.append(result)
+                logger.write_info(f"Trial {len(trials)}: loss {result['loss']:.2f} "
+                                  f"({result['evaluations']} evaluations) {json.dumps(result['hparams'], default=to_json)}")
+        trials = comm.bcast(trials if Me == 0 else None, root=0)
+
+    if Me == 0:
+        recommendation = dict(fixed_hparams, **optimizer.provide_recommendation().kwargs)
+        logger.write_info(f'Recommendation: {json.dumps(recommendation, default=to_json)}')
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'recommendation': recommendation, 'trials': trials}, f, indent=2,
+                      default=to_json)
+    logger.close()
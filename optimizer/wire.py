@@ -0,0 +1,72 @@
+from itertools import chain
+
+import numpy as np
+
+from optimizer.solution import Solution
+from optimizer.solution_space import SolutionSpace
+from optimizer.timing import timers
+
+# one int32 row per solution: indices of olevel and simd in SolutionSpace, then the numeric fields as they are
+# (so shapes given with --problem_size and thrdblock_x, which are not always in SolutionSpace, are exact)
+WIDTH = len(Solution.FIELDS)
+MISSING = -1  # first column of a row standing for None
+
+
+MISSING_ROW = (MISSING,) * WIDTH
+
+
+def get_indices():
+    """
+    Indices of olevels and simds, from the current SolutionSpace lists (simds can be removed by --prebuild): encoding
+    and decoding always use the same lists, which every rank changes identically
+    """
+    return ({olevel: i for i, olevel in enumerate(SolutionSpace.o_levels)},
+            {simd: i for i, simd in enumerate(SolutionSpace.simds)})
+
+
+def encode_solutions(solutions):
+    olevels, simds = get_indices()
+    rows = [MISSING_ROW if solution is None else
+            (olevels[solution.olevel], simds[solution.simd]) + solution.get_key()[2:] for solution in solutions]
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int32, count=len(rows) * WIDTH).reshape(len(rows), WIDTH)
+
+
+_decoded = {}  # (olevels, simds): {row: solution}, solutions being interned they can be kept
+
+
+def decode_solutions(array):
+    spaces = (tuple(SolutionSpace.o_levels), tuple(SolutionSpace.simds))
+    decoded = _decoded.setdefault(spaces, {MISSING_ROW: None})
+    solutions = []
+    for row in map(tuple, array.tolist()):
+        solution = decoded.get(row)
+        if solution is None and row != MISSING_ROW:
+            solution = Solution(spaces[0][row[0]], spaces[1][row[1]], *row[2:])
+            decoded[row] = solution
+        solutions.append(solution)
+    return solutions
+
+
+def bcast_solutions(comm, solutions, root=0):
+    """The solutions of the root on every rank (costs are plain floats, pickling them is faster)"""
+    with timers.phase('mpi_wait'):
+        count = np.array([len(solutions) if comm.Get_rank() == root else 0], dtype=np.int64)
+        comm.Bcast(count, root=root)
+        array = encode_solutions(solutions) if comm.Get_rank() == root else np.empty((count[0], WIDTH), np.int32)
+        comm.Bcast(array, root=root)
+    return decode_solutions(array)
+
+
+def share_out(comm, items, measure):
+    """
+    Collective, all ranks passing the same items: rank r computes measure(items[r::size]), one value per item,
+    and every rank gets the values of all items in their order
+    """
+    rank, size = comm.Get_rank(), comm.Get_size()
+    mine = measure(items[rank::size])
+    with timers.phase('mpi_wait'):
+        shares = comm.allgather(mine)
+    values = [None] * len(items)
+    for other_rank, share in enumerate(shares):
+        values[other_rank::size] = share
+    return values